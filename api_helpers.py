@@ -1,14 +1,34 @@
 import logging
+import os
+import re
 import requests
 import json
-import tiktoken
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config_const import (
+    WHISPER_MODEL, WHISPER_RETRY_BACKOFF,
+    GPT_MODEL, REFORMAT_WINDOW_TOKENS, REFORMAT_MAX_CONCURRENCY,
+)
+from http_client_helpers import get_api_client
+from whisper_cache_helpers import whisper_cache_key, get_cached_transcription, store_transcription
 
 
 # Set up basic configuration for logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Get the tiktoken encoding for a model, loaded once per process
+@lru_cache(maxsize=None)
+def get_encoding(model=GPT_MODEL):
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        print(f"Warning: Model {model} not found. Using default encoding.")
+        return tiktoken.get_encoding("cl100k_base")
+
 # Calculate the number of tokens used by a list of messages for a specific GPT model    
-def num_tokens_from_messages(messages, model="gpt-4-1106-preview"):
+def num_tokens_from_messages(messages, model=GPT_MODEL):
     """
     Return the number of tokens used by a list of messages for a specific GPT model.
 
@@ -16,21 +36,21 @@ def num_tokens_from_messages(messages, model="gpt-4-1106-preview"):
     :param model: The model name (default: "gpt-3.5-turbo").
     :return: The number of tokens used.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: Model gpt-4-1106-preview. Using default encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+    encoding = get_encoding(model)
 
     # Assumptions for token costs per message for GPT-3.5 Turbo and GPT-4 models
     tokens_per_message = 3 if "turbo" in model else 4
     tokens_per_name = 1 if "turbo" in model else -1
 
+    # Encode every message value in one batch call
+    values = [value for message in messages for value in message.values()]
+    encoded_values = iter(encoding.encode_batch(values))
+
     num_tokens = 0
     for message in messages:
         num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
+        for key in message:
+            num_tokens += len(next(encoded_values))
             if key == "name":
                 num_tokens += tokens_per_name
 
@@ -46,61 +66,318 @@ def call_whisper_api(file_path, openai_api_key):
     :param openai_api_key: Your OpenAI API key.
     :return: The transcribed text or None if the transcription fails.
     """
-    url = "https://api.openai.com/v1/audio/transcriptions"
-
     headers = {
         "Authorization": f"Bearer {openai_api_key}"
     }
 
-    files = {
-        "file": open(file_path, 'rb'),
-        "model": (None, "whisper-1")
-    }
+    # Opened per attempt so a retry re-sends the file from the start; the client closes it
+    def files():
+        return {
+            "file": (os.path.basename(file_path), open(file_path, 'rb')),
+            "model": (None, WHISPER_MODEL)
+        }
 
     try:
-        response = requests.post(url, headers=headers, files=files)
-        response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
+        # Raises an HTTPError if the request still fails after the client's retries
+        response = get_api_client().post("/audio/transcriptions", headers=headers, files=files)
         transcription_response = response.json()
         return transcription_response.get('text', '')
     except requests.RequestException as e:
         print(f"Error calling Whisper API: {e}")
         return None
+
+# Transcribe a single part, retrying it on its own if it fails
+def transcribe_part_with_retries(file_path, backend, max_retries=None, backoff=WHISPER_RETRY_BACKOFF):
+    """
+    Transcribes one audio part, retrying only that part when the backend fails.
+
+    :param file_path: Path to the audio part.
+    :param backend: Transcription backend from transcription_backends.get_transcription_backend.
+    :param max_retries: Number of extra attempts after the first failure; defaults to the
+        backend's part_retries.
+    :param backoff: Base delay in seconds, doubled after every failed attempt.
+    :return: The transcribed text or None if every attempt failed.
+    """
+    # Identical audio was already transcribed by this model, skip the backend entirely
+    cache_key = whisper_cache_key(file_path, backend.model)
+    cached = get_cached_transcription(cache_key)
+    if cached is not None:
+        return cached
+
+    if max_retries is None:
+        max_retries = backend.part_retries
+    for attempt in range(max_retries + 1):
+        transcription = backend.transcribe(file_path)
+        # An empty string is a successful transcription of a silent part
+        if transcription is not None:
+            store_transcription(cache_key, backend.model, transcription)
+            return transcription
+        if attempt < max_retries:
+            delay = backoff * (2 ** attempt)
+            logging.warning(f"Retrying part {file_path} in {delay}s (attempt {attempt + 2} of {max_retries + 1})")
+            time.sleep(delay)
+    return None
+
+# Transcribe audio parts in parallel and keep them in part order
+def transcribe_parts_concurrently(file_paths, backend, max_workers=None, progress_callback=None):
+    """
+    Sends audio parts to a transcription backend in parallel with a bounded number in flight.
+
+    :param file_paths: Ordered list of audio part paths.
+    :param backend: Transcription backend from transcription_backends.get_transcription_backend.
+    :param max_workers: Maximum number of parts transcribed at the same time; defaults to
+        the backend's max_concurrency.
+    :param progress_callback: Optional callable(part_index, total_parts, part_path, transcription),
+        called from the calling thread as each part finishes.
+    :return: List of transcriptions in part order, with None for parts that failed after all retries.
+    """
+    results = [None] * len(file_paths)
+    if not file_paths:
+        return results
+
+    max_workers = max_workers or backend.max_concurrency
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(file_paths)))) as executor:
+        futures = {
+            executor.submit(transcribe_part_with_retries, part_path, backend): index
+            for index, part_path in enumerate(file_paths)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                logging.error(f"Unexpected error transcribing part {file_paths[index]}: {e}")
+                results[index] = None
+            if progress_callback:
+                progress_callback(index, len(file_paths), file_paths[index], results[index])
+
+    return results
     
-# Call the GPT-4 API for reformating the transcript
-def reformat_transcript_with_gpt4(raw_transcription, openai_api_key):
+REFORMAT_SYSTEM_PROMPT = "\"You are the AI text-editor called Jarvy\"\nTASK:\nYour task is to reformat the transcript into a more readable format by breaking it into paragraphs to improve readability. \nINSTRUCTIONS: \n1.You are provided with a raw transcript from a course video. \n2 . Ensure all original content remains intact and do not add any headers or titles. The aim is to enhance the flow and readability while maintaining the integrity of the original content. \n3. Reformat the transcript to make it more reader-friendly without altering the content or adding titles.\n\nDO:\n1. Follow the instructions\n\n"
+
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+# Build the chat messages used to reformat a transcript
+def build_reformat_messages(raw_transcription):
+    return [
+        {"role": "system","content": REFORMAT_SYSTEM_PROMPT},
+        {"role": "user","content": "Here is the transcript: \n\n{raw_transcription}".format(raw_transcription=raw_transcription)},
+        {"role": "user","content": "Please do not add any headings, bullet points or any other styling. "},
+    ]
+
+# Call the chat completions API
+def call_chat_completion(messages, openai_api_key, model=GPT_MODEL):
     """
-    Calls GPT-4 API to reformat a raw transcript into a more readable format.
+    Calls the chat completions API with the given messages.
 
-    :param raw_transcription: The raw transcript text to be reformatted.
+    :param messages: A list of message dictionaries with 'role' and 'content'.
     :param openai_api_key: Your OpenAI API key.
-    :return: The reformatted transcript.
+    :param model: The chat model to use.
+    :return: Tuple of (response text, usage dictionary), or (None, None) if the call fails.
     """
-    url = "https://api.openai.com/v1/chat/completions"
-
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {openai_api_key}",
     }
 
-
     data = {
-        "model": "gpt-4-1106-preview",  # Update the model to "gpt-4" when available
-        "messages": [
-
-            {"role": "system","content": "\"You are the AI text-editor called Jarvy\"\nTASK:\nYour task is to reformat the transcript into a more readable format by breaking it into paragraphs to improve readability. \nINSTRUCTIONS: \n1.You are provided with a raw transcript from a course video. \n2 . Ensure all original content remains intact and do not add any headers or titles. The aim is to enhance the flow and readability while maintaining the integrity of the original content. \n3. Reformat the transcript to make it more reader-friendly without altering the content or adding titles.\n\nDO:\n1. Follow the instructions\n\n"},
-            {"role": "user","content": "Here is the transcript: \n\n{raw_transcription}".format(raw_transcription=raw_transcription)},
-            {"role": "user","content": "Please do not add any headings, bullet points or any other styling. "},
-        ],
+        "model": model,
+        "messages": messages,
     }
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        response.raise_for_status()
+        response = get_api_client().post("/chat/completions", headers=headers, data=json.dumps(data))
         response_data = response.json()
         if 'choices' in response_data: 
+            if response_data['choices'][0].get('finish_reason') == "length":
+                logging.error("Chat completion was cut off at the token limit")
+                return None, None
             output_content = response_data['choices'][0]['message']['content']
-            return output_content
+            return output_content, response_data.get('usage', {})
         else:
-            return None
+            return None, None
     except requests.RequestException as e:
         print(f"Error calling GPT-4 API: {e}")
-        return None
\ No newline at end of file
+        return None, None
+
+# Split a transcript on sentence boundaries into token-budgeted windows
+def split_transcript_into_windows(raw_transcription, max_window_tokens=REFORMAT_WINDOW_TOKENS, model=GPT_MODEL):
+    """
+    Splits a transcript into windows whose reformat request stays within max_window_tokens.
+
+    The fixed cost of the prompt is measured once with num_tokens_from_messages and
+    each sentence is encoded once, so sizing is linear in the transcript length.
+
+    :param raw_transcription: The raw transcript text.
+    :param max_window_tokens: Token budget for the whole request of a single window.
+    :param model: The model the windows are sized for.
+    :return: List of transcript windows in order.
+    """
+    encoding = get_encoding(model)
+    prompt_tokens = num_tokens_from_messages(build_reformat_messages(""), model)
+    budget = max(1, max_window_tokens - prompt_tokens)
+
+    windows = []
+    current = []
+    current_tokens = 0
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(raw_transcription.strip()):
+        if not sentence:
+            continue
+        tokens = encoding.encode(sentence)
+        # A single sentence over the budget is cut into budget-sized token runs
+        pieces = [encoding.decode(tokens[start:start + budget]) for start in range(0, len(tokens), budget)] if len(tokens) > budget else [sentence]
+        for piece in pieces:
+            piece_tokens = min(len(tokens), budget) + 1  # +1 for the joining space
+            if current and current_tokens + piece_tokens > budget:
+                windows.append(" ".join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        windows.append(" ".join(current))
+    return windows
+
+# Reformat a single window and measure it
+def reformat_window(window_index, window_text, openai_api_key):
+    start = time.perf_counter()
+    formatted_text, usage = call_chat_completion(build_reformat_messages(window_text), openai_api_key)
+    usage = usage or {}
+    metrics = {
+        'window': window_index,
+        'latency_seconds': round(time.perf_counter() - start, 3),
+        'prompt_tokens': usage.get('prompt_tokens'),
+        'completion_tokens': usage.get('completion_tokens'),
+    }
+    return formatted_text, metrics
+
+# Reformat a long transcript in parallel windows and stitch the results back in order
+def reformat_transcript_in_windows(windows, openai_api_key, max_workers=REFORMAT_MAX_CONCURRENCY, progress_callback=None):
+    """
+    Sends transcript windows to the chat API concurrently and joins the results in order.
+
+    :param windows: Transcript windows from split_transcript_into_windows.
+    :param openai_api_key: Your OpenAI API key.
+    :param max_workers: Maximum number of windows in flight at once.
+    :param progress_callback: Optional callable(window_index, total_windows, metrics), called
+        from the calling thread as each window finishes. metrics holds the window's latency
+        and token usage.
+    :return: The reformatted transcript, or None if any window failed.
+    """
+    results = [None] * len(windows)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(windows)))) as executor:
+        futures = {
+            executor.submit(reformat_window, index, window_text, openai_api_key): index
+            for index, window_text in enumerate(windows)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index], metrics = future.result()
+            logging.info(f"Reformatted window {index + 1} of {len(windows)}: {metrics}")
+            if progress_callback:
+                progress_callback(index, len(windows), metrics)
+
+    if any(result is None for result in results):
+        logging.error("Failed to reformat one or more transcript windows")
+        return None
+    return "\n\n".join(result.strip() for result in results)
+
+# Call the GPT-4 API for reformating the transcript
+def reformat_transcript_with_gpt4(raw_transcription, openai_api_key, progress_callback=None):
+    """
+    Calls GPT-4 API to reformat a raw transcript into a more readable format.
+
+    Transcripts that do not fit in a single window are split on sentence boundaries
+    and reformatted in parallel windows.
+
+    :param raw_transcription: The raw transcript text to be reformatted.
+    :param openai_api_key: Your OpenAI API key.
+    :param progress_callback: Optional callable(window_index, total_windows, metrics).
+    :return: The reformatted transcript.
+    """
+    windows = split_transcript_into_windows(raw_transcription)
+    if len(windows) <= 1:
+        formatted_text, metrics = reformat_window(0, raw_transcription, openai_api_key)
+        if progress_callback:
+            progress_callback(0, 1, metrics)
+        return formatted_text
+    return reformat_transcript_in_windows(windows, openai_api_key, progress_callback=progress_callback)
+
+# Stream a chat completion, yielding text as it arrives
+def stream_chat_completion(messages, openai_api_key, model=GPT_MODEL):
+    """
+    Calls the chat completions API in streaming mode and yields content deltas from
+    the server-sent events as they arrive.
+
+    :param messages: A list of message dictionaries with 'role' and 'content'.
+    :param openai_api_key: Your OpenAI API key.
+    :param model: The chat model to use.
+    :return: Generator of text fragments.
+    :raises requests.RequestException: If the request fails or the connection drops.
+    :raises RuntimeError: If the stream ends without [DONE] or the reply hit the token limit.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {openai_api_key}",
+    }
+
+    data = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+    }
+    response = get_api_client().post("/chat/completions", headers=headers, data=json.dumps(data), stream=True)
+    finish_reason = None
+    done = False
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            event_data = line[len("data:"):].strip()
+            if event_data == "[DONE]":
+                done = True
+                break
+            choices = json.loads(event_data).get('choices') or [{}]
+            content = choices[0].get('delta', {}).get('content')
+            if content:
+                yield content
+            finish_reason = choices[0].get('finish_reason') or finish_reason
+    finally:
+        response.close()
+    # A stream can end cleanly at the HTTP level and still be missing the rest of the reply
+    if not done:
+        raise RuntimeError("Chat completion stream ended before [DONE]")
+    if finish_reason == "length":
+        raise RuntimeError("Chat completion was cut off at the token limit")
+
+# Stream a reformatted transcript in order, first window token by token
+def stream_reformat_transcript(raw_transcription, openai_api_key, max_workers=REFORMAT_MAX_CONCURRENCY):
+    """
+    Yields the reformatted transcript as it becomes available.
+
+    The first window is streamed so output starts within about a second. The remaining
+    windows are sent concurrently as regular requests at the same time, and each is
+    yielded in order once it and every window before it are done.
+
+    :param raw_transcription: The raw transcript text to be reformatted.
+    :param openai_api_key: Your OpenAI API key.
+    :param max_workers: Maximum number of non-streamed windows in flight at once.
+    :return: Generator of text fragments.
+    :raises RuntimeError: If a window fails; everything yielded before it is valid output.
+    """
+    windows = split_transcript_into_windows(raw_transcription) or [raw_transcription]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(windows) - 1 or 1))) as executor:
+        futures = [
+            executor.submit(reformat_window, index, window_text, openai_api_key)
+            for index, window_text in enumerate(windows[1:], start=1)
+        ]
+        try:
+            yield from stream_chat_completion(build_reformat_messages(windows[0]), openai_api_key)
+            for index, future in enumerate(futures, start=1):
+                formatted_text, metrics = future.result()
+                if formatted_text is None:
+                    raise RuntimeError(f"Failed to reformat transcript window {index + 1} of {len(windows)}")
+                logging.info(f"Reformatted window {index + 1} of {len(windows)}: {metrics}")
+                yield "\n\n" + formatted_text.strip()
+        finally:
+            for future in futures:
+                future.cancel()
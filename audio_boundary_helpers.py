@@ -0,0 +1,150 @@
+import logging
+import math
+import subprocess
+import numpy as np
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ANALYSIS_SAMPLE_RATE = 8000  # speech energy is well represented at 8 kHz mono
+ANALYSIS_WINDOW_SECONDS = 0.05
+ANALYSIS_SMOOTHING_WINDOWS = 5  # average 250 ms so single quiet samples don't win over real pauses
+
+# Compute short-window RMS energy of an audio or video file
+def compute_rms_energy(file_path, sample_rate=ANALYSIS_SAMPLE_RATE, window_seconds=ANALYSIS_WINDOW_SECONDS, block_seconds=60):
+    """
+    Computes RMS energy over short windows of downsampled mono PCM.
+
+    PCM is streamed from ffmpeg one block at a time, so only the energy array
+    (a few floats per second of audio) is kept in memory.
+
+    :param file_path: Path to the audio or video file.
+    :param sample_rate: Sample rate the audio is downsampled to before analysis.
+    :param window_seconds: Length of a single energy window in seconds.
+    :param block_seconds: Amount of PCM read from ffmpeg per block.
+    :return: Tuple of (energy per window as a NumPy array, total duration in seconds).
+    """
+    samples_per_window = max(1, int(sample_rate * window_seconds))
+    window_bytes = samples_per_window * 2  # 16-bit samples
+    block_bytes = window_bytes * max(1, int(block_seconds / window_seconds))
+
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", file_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "-",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    energies = []
+    total_samples = 0
+    pending = b''
+    try:
+        while True:
+            chunk = process.stdout.read(block_bytes)
+            if not chunk:
+                break
+            data = pending + chunk
+            usable = len(data) - len(data) % window_bytes
+            pending = data[usable:]
+            if usable:
+                energies.append(_window_rms(data[:usable], samples_per_window))
+                total_samples += usable // 2
+        # Pad the last partial window with silence
+        if len(pending) >= 2:
+            pending = pending[:len(pending) - len(pending) % 2]
+            total_samples += len(pending) // 2
+            energies.append(_window_rms(pending + b'\x00' * (window_bytes - len(pending)), samples_per_window))
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors='replace')
+        process.stderr.close()
+        return_code = process.wait()
+
+    if return_code != 0:
+        logging.error(f"Error analysing audio energy of {file_path}: {stderr}")
+        raise RuntimeError(f"ffmpeg exited with status {return_code} while analysing {file_path}")
+
+    energy = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+    return energy, total_samples / sample_rate
+
+def _window_rms(pcm_bytes, samples_per_window):
+    samples = np.frombuffer(pcm_bytes, dtype='<i2').astype(np.float32)
+    frames = samples.reshape(-1, samples_per_window)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+# Plan cut points at the quietest moment near each target cut
+def plan_cut_points(energy, total_duration, max_part_seconds, target_part_seconds=None, search_seconds=30,
+                    window_seconds=ANALYSIS_WINDOW_SECONDS, smoothing_windows=ANALYSIS_SMOOTHING_WINDOWS):
+    """
+    Chooses cut points so every part is at most max_part_seconds long and each cut lands in a pause.
+
+    Parts are planned to be of even length: the audio is divided into equal parts no longer
+    than target_part_seconds, and each cut is moved to the quietest point within
+    search_seconds of its target without letting the part exceed max_part_seconds. Among
+    equally quiet points the one closest to the target wins. Each target is recomputed from
+    the audio left after the previous cut, so cuts pulled early do not pile up into a short
+    last part.
+
+    :param energy: RMS energy per window, as returned by compute_rms_energy.
+    :param total_duration: Duration of the audio in seconds.
+    :param max_part_seconds: Hard upper bound on the length of a single part.
+    :param target_part_seconds: Preferred part length; defaults to max_part_seconds.
+    :param search_seconds: How far from the target cut to look for a pause.
+    :param window_seconds: Length of a single energy window in seconds.
+    :param smoothing_windows: Number of windows averaged before looking for the minimum.
+    :return: Sorted list of cut times in seconds.
+    """
+    target_part_seconds = min(target_part_seconds or max_part_seconds, max_part_seconds)
+    if total_duration <= target_part_seconds or len(energy) == 0:
+        return []
+
+    if smoothing_windows > 1:
+        kernel = np.ones(smoothing_windows, dtype=np.float32) / smoothing_windows
+        energy = np.convolve(energy, kernel, mode='same')
+
+    part_count = math.ceil(total_duration / target_part_seconds)
+    cut_points = []
+    start = 0.0
+    for part_index in range(1, part_count):
+        target = start + (total_duration - start) / (part_count - part_index + 1)
+        # Never cut so early that the parts still to come cannot hold the rest of the audio
+        lowest = max(start + target_part_seconds / 2, target - search_seconds,
+                     total_duration - (part_count - part_index) * max_part_seconds)
+        highest = min(start + max_part_seconds, target + search_seconds)
+
+        first_window = int(lowest / window_seconds)
+        last_window = min(int(highest / window_seconds), len(energy))
+        if last_window <= first_window:
+            cut = min(target, start + max_part_seconds)
+        else:
+            window_energy = energy[first_window:last_window]
+            # Regular pauses are often equally quiet; take the one nearest the target
+            quiet_windows = first_window + np.flatnonzero(np.isclose(window_energy, window_energy.min()))
+            quietest = int(quiet_windows[np.argmin(np.abs((quiet_windows + 0.5) * window_seconds - target))])
+            cut = min((quietest + 0.5) * window_seconds, start + max_part_seconds)
+
+        cut_points.append(round(cut, 3))
+        start = cut
+
+    # A cut pulled early by a pause can leave a last part over the limit; fall back to hard cuts
+    while total_duration - start > max_part_seconds:
+        start += max_part_seconds
+        cut_points.append(round(start, 3))
+
+    return cut_points
+
+# Analyse a file and plan its silence-aware cut points
+def find_silence_cut_points(file_path, max_part_seconds, target_part_seconds=None, search_seconds=30):
+    """
+    Plans cut points for splitting a file at pauses in speech.
+
+    :param file_path: Path to the audio or video file.
+    :param max_part_seconds: Hard upper bound on the length of a single part.
+    :param target_part_seconds: Preferred part length.
+    :param search_seconds: How far from each target cut to look for a pause.
+    :return: Sorted list of cut times in seconds.
+    """
+    energy, total_duration = compute_rms_energy(file_path)
+    cut_points = plan_cut_points(energy, total_duration, max_part_seconds, target_part_seconds, search_seconds)
+    logging.info(f"Planned {len(cut_points)} cut points for {file_path} ({total_duration:.0f}s of audio)")
+    return cut_points
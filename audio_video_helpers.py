@@ -1,8 +1,15 @@
+import hashlib
 import logging
 import os
-from moviepy.editor import VideoFileClip, AudioFileClip
-from pydub import AudioSegment
-from pytube import YouTube
+import re
+import subprocess
+import requests
+from config_const import (
+    SPLIT_AUDIO_BITRATE_KBPS, SPLIT_TARGET_PART_SECONDS, WHISPER_MAX_FILE_SIZE,
+    PRECONDITION_CODEC, PRECONDITION_BITRATE_KBPS, PRECONDITION_SAMPLE_RATE,
+    UPLOAD_BLOCK_SIZE, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, YOUTUBE_MIN_AUDIO_KBPS, YOUTUBE_RANGE_SIZE,
+)
+from media_probe_helpers import probe_media
 
 # Set up basic configuration for logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,138 +18,242 @@ def get_file_duration(file_path):
     """
     Gets the duration of the given audio or video file.
 
-    :param file_path: Path to the audio or video file.
+    :param file_path: Path to the audio or video file, or an in-memory upload.
     :return: Duration of the file in seconds.
     """
     try:
-        # Check the file extension to determine if it's audio or video
-        if any(file_path.endswith(ext) for ext in ['.mp3', '.wav', '.ogg', '.flac']):
-            # Handle audio file
-            audio_clip = AudioFileClip(file_path)
-            duration = audio_clip.duration
-            audio_clip.close()
-        elif any(file_path.endswith(ext) for ext in ['.mp4', '.mov', '.avi', '.mkv']):
-            # Handle video file
-            video_clip = VideoFileClip(file_path)
-            duration = video_clip.duration
-            video_clip.close()
-        else:
+        duration = probe_media(file_path)['duration']
+        if duration is None:
             raise ValueError("Unsupported file format")
-
         return duration
     except Exception as e:
         # Handle errors: log them or re-raise them
-        logging.error(f"Error getting duration of file {file_path}: {e}")
+        logging.error(f"Error getting duration of file {getattr(file_path, 'name', file_path)}: {e}")
         raise
     
-#Get file metadata to determine size and duration
-def get_file_metadata(file_path):
-    logging.info(f"Getting metadata for file: {file_path}")
-    file_size = os.path.getsize(file_path)
-    duration = None
-    if file_path.endswith('.mp3') or file_path.endswith('.wav'):
-        audio = AudioFileClip(file_path)
-        duration = audio.duration
-    elif file_path.endswith('.mp4'):
-        video = VideoFileClip(file_path)
-        duration = video.duration
-
-    return {
-        'size': file_size,  # size in bytes
-        'duration': duration  # duration in seconds
-    }
-
-def download_youtube_video(url, output_path='uploads/youtube_videos'):
+# Parse a pytube bitrate such as "48kbps"
+def _stream_kbps(stream):
+    match = re.match(r'(\d+)', getattr(stream, 'abr', None) or '')
+    return int(match.group(1)) if match else 0
+
+# Pick the smallest audio-only stream that is still good enough for speech
+def select_speech_audio_stream(streams, min_kbps=YOUTUBE_MIN_AUDIO_KBPS):
+    """
+    :param streams: Audio-only streams, e.g. YouTube(url).streams.filter(only_audio=True).
+    :param min_kbps: Lowest bitrate considered good enough for transcription.
+    :return: The lowest-bitrate stream at or above min_kbps, otherwise the best one
+        below it, or None if there are no streams.
+    """
+    streams = [stream for stream in streams if _stream_kbps(stream)]
+    if not streams:
+        return None
+    good_enough = [stream for stream in streams if _stream_kbps(stream) >= min_kbps]
+    if good_enough:
+        return min(good_enough, key=_stream_kbps)
+    return max(streams, key=_stream_kbps)
+
+# Download a URL to a file in ranged chunks, hashing it as it is written
+def stream_url_to_file(url, output_path, block_size=UPLOAD_BLOCK_SIZE, range_size=YOUTUBE_RANGE_SIZE, session=None):
+    """
+    Fetches the URL in consecutive Range requests of range_size bytes and writes each
+    block as it arrives, so memory use does not depend on the file size. The file is
+    written under a temporary name and renamed when complete.
+
+    :param url: URL of the media.
+    :param output_path: Final path of the file.
+    :param block_size: Size of the blocks read from the response and hashed.
+    :param range_size: Bytes requested per Range request; None downloads in one request.
+    :param session: Optional requests.Session to reuse connections.
+    :return: Tuple of (output_path, SHA-256 hex digest, size in bytes).
+    """
+    session = session or requests.Session()
+    hasher = hashlib.sha256()
+    temp_path = output_path + ".part"
+    size = 0
+    try:
+        with open(temp_path, 'wb') as output_file:
+            while True:
+                headers = {'Range': f"bytes={size}-{size + range_size - 1}"} if range_size else {}
+                with session.get(url, headers=headers, stream=True, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)) as response:
+                    # Asking past the end of a file that ended exactly on a range boundary
+                    if response.status_code == 416 and size:
+                        break
+                    response.raise_for_status()
+                    received = 0
+                    for block in response.iter_content(chunk_size=block_size):
+                        output_file.write(block)
+                        hasher.update(block)
+                        received += len(block)
+                    size += received
+                    # A server that ignores Range sends the whole file with 200; a short range is the last one
+                    if not range_size or response.status_code != 206 or received < range_size:
+                        break
+        os.replace(temp_path, output_path)
+    except BaseException:
+        # Do not leave a partial download behind
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return output_path, hasher.hexdigest(), size
+
+# Audio file extensions for YouTube audio-only container types
+YOUTUBE_AUDIO_EXTENSIONS = {'mp4': '.m4a', 'webm': '.webm'}
+
+# Download only the audio of a YouTube video
+def download_youtube_audio(url, output_path='uploads/youtube_videos'):
+    """
+    Downloads the smallest speech-quality audio-only stream of a YouTube video. No
+    video frames are downloaded, and the result goes straight to precondition_audio.
+
+    :param url: YouTube video URL.
+    :param output_path: Folder for the downloaded audio.
+    :return: Tuple of (file path, SHA-256 hex digest, size in bytes), or None on failure.
+    """
+    # pytube and werkzeug are only needed here; importing them lazily keeps page loads fast
+    from pytube import YouTube
+    from werkzeug.utils import secure_filename
     try:
-        # Ensure the output directory exists
         os.makedirs(output_path, exist_ok=True)
-        
-        # Create a YouTube object with the URL
         yt = YouTube(url)
-        
-        # Get the highest resolution stream available
-        video_stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
-        
-        if video_stream:
-            # Construct the output file path
-            output_file_path = os.path.join(output_path, video_stream.default_filename)
-            
-            # Download the video
-            video_stream.download(output_path=output_path)
-            print(f"Downloaded '{video_stream.default_filename}' to '{output_path}'")
-            
-            return output_file_path
-        else:
-            print("No suitable video stream found.")
+        audio_stream = select_speech_audio_stream(yt.streams.filter(only_audio=True))
+        if audio_stream is None:
+            logging.error(f"No audio-only stream found for {url}")
             return None
+        base_name = secure_filename(os.path.splitext(audio_stream.default_filename)[0]) or yt.video_id
+        extension = YOUTUBE_AUDIO_EXTENSIONS.get(audio_stream.subtype, f".{audio_stream.subtype}")
+        output_file_path = os.path.join(output_path, base_name + extension)
+        logging.info(f"Downloading {audio_stream.abr} {audio_stream.mime_type} audio of {url}")
+        return stream_url_to_file(audio_stream.url, output_file_path)
     except Exception as e:
-        print(f"An error occurred while downloading the video: {e}")
+        logging.error(f"An error occurred while downloading the audio: {e}")
         return None
     
 
-# Extract audio from video files 
-def extract_audio_from_video(video_file_path, output_audio_path):
-    logging.info(f"Extracting audio from video file: {video_file_path}")
-    try:
-        video = VideoFileClip(video_file_path)
-        video.audio.write_audiofile(output_audio_path)
-        logging.info(f"Audio extracted to {output_audio_path}")
-        return output_audio_path
-    except Exception as e:
-        logging.error(f"Error occurred while extracting audio: {e}")
-        return None
+# Encoder settings for speech-optimized audio, keyed by PRECONDITION_CODEC
+PRECONDITION_ENCODERS = {
+    'mp3': ('.mp3', ["-c:a", "libmp3lame"]),
+    'opus': ('.ogg', ["-c:a", "libopus", "-application", "voip"]),
+}
 
-# Process audio/video files
-def process_audio_video_file(file_path, filename):
-    logging.info(f"Processing file: {filename}")
-    
-    # Get file metadata to determine size and duration
-    metadata = get_file_metadata(file_path)
-    file_size = metadata['size']
+# Precondition audio for transcription: 16 kHz mono at a low bitrate
+def precondition_audio(input_path, output_path=None, codec=PRECONDITION_CODEC, bitrate_kbps=PRECONDITION_BITRATE_KBPS, output_directory=None):
+    """
+    Converts any audio or video file into speech-optimized audio in one ffmpeg pass.
 
-    # Initialize a variable to store the path of the file to be transcribed
-    file_to_transcribe = file_path
+    Video streams are dropped without being decoded, so the same call handles plain
+    audio files and audio inside a video container.
 
-    # Convert video files to audio before further processing
-    if filename.endswith('.mp4'):
-        logging.info(f"Converting video file to audio: {filename}")
-        audio_path = extract_audio_from_video(file_path, f"{file_path}_audio.mp3")
-        file_to_transcribe = audio_path
+    :param input_path: Path to the audio or video file.
+    :param output_path: Path for the output; defaults to the input path with a "_speech" suffix.
+    :param codec: "mp3" or "opus".
+    :param bitrate_kbps: Target bitrate of the output.
+    :param output_directory: Folder for the default output path instead of the input's folder.
+    :return: Path to the preconditioned audio or None if the conversion failed.
+    """
+    extension, encoder_args = PRECONDITION_ENCODERS[codec]
+    if output_path is None:
+        output_path = os.path.join(output_directory or os.path.dirname(input_path), os.path.basename(input_path)) + f"_speech{extension}"
+    logging.info(f"Preconditioning audio: {input_path}")
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-i", input_path,
+        "-vn", "-map", "0:a:0",
+        "-ac", "1", "-ar", str(PRECONDITION_SAMPLE_RATE),
+        *encoder_args, "-b:a", f"{bitrate_kbps}k",
+        output_path,
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True)
+        logging.info(f"Preconditioned audio written to {output_path}")
+        return output_path
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error occurred while preconditioning audio: {e.stderr}")
+        return None
 
-    # Split the file if it's larger than 25 MB
-    if file_size > 26214400 :
+# Split preconditioned audio only if it is still over the API limit
+def split_for_transcription(file_to_transcribe, filename):
+    file_size = os.path.getsize(file_to_transcribe)
+    if file_size > WHISPER_MAX_FILE_SIZE:
         logging.info(f"File size exceeds limit. Splitting file: {filename}")
-        split_file_paths = split_large_avfile(file_to_transcribe)
+        split_file_paths = split_large_avfile(file_to_transcribe, bitrate_kbps=PRECONDITION_BITRATE_KBPS, copy_codec=True)
         logging.info(f"File split into {len(split_file_paths)} parts")
         return split_file_paths
 
     # If file size is within the limit, return the single file path
     return [file_to_transcribe]
 
+# Path of a single part of a split file
+def part_file_path(file_path, part_num, extension=".mp3"):
+    return f"{file_path}_part{part_num}{extension}"
+
+# Remove parts left over from an earlier split of the same file
+def remove_stale_parts(file_path, extension=".mp3"):
+    part_num = 1
+    while os.path.exists(part_file_path(file_path, part_num, extension)):
+        os.remove(part_file_path(file_path, part_num, extension))
+        part_num += 1
+
 # Split large audio-vido files into smaller parts 
-def split_large_avfile(file_path, max_size=24.5*1024*1024):  # max_size in bytes
+def split_large_avfile(file_path, max_size=WHISPER_MAX_FILE_SIZE, bitrate_kbps=SPLIT_AUDIO_BITRATE_KBPS, target_part_seconds=SPLIT_TARGET_PART_SECONDS, copy_codec=False):  # max_size in bytes
+    """
+    Splits a large audio or video file into parts that each stay under max_size.
+
+    The file is streamed through ffmpeg's segment muxer, which decodes and encodes
+    it window by window, so memory use stays flat regardless of the input duration.
+    Cuts are placed in pauses found by find_silence_cut_points so words are not split.
+
+    :param file_path: Path to the audio or video file.
+    :param max_size: Maximum size of a single part in bytes.
+    :param bitrate_kbps: Bitrate of the parts; with copy_codec, the bitrate of the input audio.
+    :param target_part_seconds: Preferred part length; shorter, even parts transcribe better in parallel.
+    :param copy_codec: Copy the input's audio packets instead of re-encoding to MP3. Use this
+        for audio that was already preconditioned at a known constant bitrate.
+    :return: List of part paths in playback order.
+    """
     file_size = os.path.getsize(file_path)
     if file_size <= max_size:
         logging.info(f"No need to split file: {file_path}")
         return [file_path]  # No need to split
 
     logging.info(f"Splitting file: {file_path}")
+    # NumPy is loaded on the first split rather than when the app starts
+    from audio_boundary_helpers import find_silence_cut_points
+    # Parts are encoded at a constant bitrate, so their size follows from their length.
+    # Leave 5% headroom for container overhead and encoder variance.
+    max_part_seconds = int(max_size * 8 / (bitrate_kbps * 1000) * 0.95)
+    cut_points = find_silence_cut_points(file_path, max_part_seconds, target_part_seconds)
+    if not cut_points:
+        logging.info(f"Audio fits in a single part: {file_path}")
+        cut_points = [max_part_seconds]
+
+    if copy_codec:
+        extension = os.path.splitext(file_path)[1]
+        codec_args = ["-c:a", "copy"]
+    else:
+        extension = ".mp3"
+        codec_args = ["-c:a", "libmp3lame", "-b:a", f"{bitrate_kbps}k"]
+
+    remove_stale_parts(file_path, extension)
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-i", file_path,
+        "-vn", "-map", "0:a:0",
+        *codec_args,
+        "-f", "segment", "-segment_times", ",".join(str(cut) for cut in cut_points),
+        "-segment_start_number", "1", "-reset_timestamps", "1",
+        f"{file_path}_part%d{extension}",
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error splitting file {file_path}: {e.stderr}")
+        raise
+
     parts = []
-    audio = AudioSegment.from_file(file_path)
-    duration = len(audio)
-    part_duration = duration * (max_size / file_size)
-    
-    start = 0
     part_num = 1
-    while start < duration:
-        end = min(start + part_duration, duration)
-        part = audio[start:end]
-        part_file_path = f"{file_path}_part{part_num}.mp3"
-        part.export(part_file_path, format="mp3")
-        parts.append(part_file_path)
-        start = end
-        part_num += 1
+    while os.path.exists(part_file_path(file_path, part_num, extension)):
+        parts.append(part_file_path(file_path, part_num, extension))
         logging.info(f"Created part {part_num} for file: {file_path}")
+        part_num += 1
 
     return parts
-
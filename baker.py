@@ -1,63 +1,46 @@
 import streamlit as st
 import os
-from audio_video_helpers import process_audio_video_file, download_youtube_video, get_file_duration
-from credit_auth_helpers import check_and_deduct_credits
-from file_helpers import list_files, get_file_details, read_file_content, delete_file, list_css_files, read_text_file
+from audio_video_helpers import precondition_audio, split_for_transcription, download_youtube_audio, get_file_duration
+from credit_auth_helpers import reserve_credits, commit_credits, release_credits
+from file_helpers import read_file_content, read_file_tail, delete_file, list_css_files, read_text_file
 import logging
-from config_const import PROCESSED_DIRECTORY, UPLOAD_DIRECTORY
-from werkzeug.utils import secure_filename
-from file_helpers import ensure_directory_exists, ensure_file_exists
-from file_hash_helpers import calculate_file_hash, write_hash_to_csv, read_hashes_from_csv, delete_hash_from_csv
+from config_const import PROCESSED_DIRECTORY, UPLOAD_DIRECTORY, JOB_STATUS_REFRESH_SECONDS, STREAM_FORMATTING, FILE_PAGE_SIZE, PREVIEW_PARAGRAPHS_PER_PAGE, DEFAULT_TRANSCRIPTION_BACKEND
+from file_helpers import ensure_directory_exists
+from file_hash_helpers import save_upload_to_temp_file, claim_file_hash, get_file_hash_entry, delete_hash_for_path
 import shutil
-from api_helpers import call_whisper_api, reformat_transcript_with_gpt4
-
-from html_creator_helper import convert_txt_to_html, clean_title
+import threading
+import uuid
+import requests
+from functools import partial
+from api_helpers import get_encoding, transcribe_parts_concurrently, reformat_transcript_with_gpt4, stream_reformat_transcript
+
+from html_creator_helper import convert_txt_to_html, clean_title, rerender_html_directory
+from estimate_helpers import estimate_uploads
+from transcription_backends import get_transcription_backend, available_transcription_backends
+from file_index_helpers import get_file_index, filter_and_sort_files, paginate
+from search_index_helpers import index_transcript_file, index_missing_documents, remove_document, search_transcripts
+from preview_helpers import get_preview_page
+from caption_helpers import caption_file_to_text
+from pipeline_stage_helpers import pipeline_stage, pipeline_stage_metrics
+from checkpoint_helpers import load_manifest, get_checkpoint, set_checkpoint
+from job_queue_helpers import register_job_handler, start_job_workers, enqueue_job, list_jobs
 import streamlit.components.v1 as components 
-import re
 
 # Set up basic configuration for logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
 TRANSCRIPT_DIRECTORY= "pr"
-download_folder = os.path.join(UPLOAD_DIRECTORY, "youtube_videos")
-ensure_directory_exists(UPLOAD_DIRECTORY)
-ensure_directory_exists(PROCESSED_DIRECTORY)
-ensure_file_exists("file_hashes.csv")
-ensure_directory_exists(download_folder)
-
-def clean_vtt_content(vtt_content):
-    # Split the content into lines
-    lines = vtt_content.splitlines()
-    # Patterns to detect timestamps and potentially unwanted lines
-    timestamp_pattern = re.compile(r'\d{2}:\d{2}:\d{2}\.\d{3} --> \d{2}:\d{2}:\d{2}\.\d{3}')
-    non_textual_pattern = re.compile(r'^\d+$|^WEBVTT|^NOTE|^STYLE|^X-|^\s*$')
-    
-    cleaned_lines = []
-    for line in lines:
-        # Skip lines matching the patterns for timestamps, "WEBVTT", empty lines, and other non-textual content
-        if timestamp_pattern.match(line) or non_textual_pattern.match(line):
-            continue
-        # Add non-empty lines to the cleaned_lines list
-        if line.strip():
-            cleaned_lines.append(line.strip())
-
-    return '\n'.join(cleaned_lines)
+CAPTION_EXTENSIONS = ('.vtt', '.srt')
 
-
-# Function to extract text from .vtt file and save as .txt
+# Function to extract text from a .vtt or .srt file and save as .txt
 def extract_text_from_vtt(vtt_file_path, output_text_file_path):
-    with open(vtt_file_path, 'r', encoding='utf-8') as vtt_file:
-        vtt_content = vtt_file.read()  # Read the entire content at once
-
-    cleaned_content = clean_vtt_content(vtt_content)  # Clean the content using the previously defined function
-
-    with open(output_text_file_path, 'w', encoding='utf-8') as output_file:
-        output_file.write(cleaned_content)  # Write the cleaned content to the output file
+    # Streams the caption file cue by cue, so large exports are never loaded whole
+    caption_file_to_text(vtt_file_path, output_text_file_path)
 
 
 #If the file to process is just a .txt file and needs to be converted to .html
-def format_text_file(file_path, format_with_gpt, openai_api_key, css_file_path, name, key):
+def format_text_file(file_path, format_with_gpt, openai_api_key, css_file_path, name, key, progress_callback=None):
     # Construct the path for the processed folder based on name and key
     user_processed_folder = os.path.join(PROCESSED_DIRECTORY, f"{name}_{key}", "html")
     ensure_directory_exists(user_processed_folder)
@@ -67,96 +50,245 @@ def format_text_file(file_path, format_with_gpt, openai_api_key, css_file_path,
     formatted_file_path = os.path.join(user_processed_folder, base_file_name + "_formatted.txt")
     html_file_path = os.path.join(user_processed_folder, base_file_name + ".html")
     
-    # Check if the file is a .vtt file
-    if file_path.endswith('.vtt'):
-        # Extract text from .vtt to a temporary .txt file
+    # Check if the file is a .vtt or .srt caption file
+    if file_path.endswith(CAPTION_EXTENSIONS):
+        # Extract text from the captions to a temporary .txt file
         temp_text_file_path = os.path.join(user_processed_folder, base_file_name + ".txt")
         extract_text_from_vtt(file_path, temp_text_file_path)
         file_path = temp_text_file_path  # Update file_path to the extracted text file
 
     # Process the file
     if format_with_gpt:
-        st.toast("Formatting with GPT-4", icon="⏳")
-        formatted_text = reformat_transcript_with_gpt4(read_text_file(file_path), openai_api_key)
-        with open(formatted_file_path, "w") as text_file:
-            text_file.write(formatted_text)
-        convert_txt_to_html(formatted_file_path, html_file_path, base_file_name, css_file_path)
+        with pipeline_stage("format", progress_callback):
+            if progress_callback:
+                progress_callback("formatting", 0, 1, "Formatting with GPT-4")
+            if not write_formatted_transcript(read_text_file(file_path), openai_api_key, formatted_file_path, progress_callback=progress_callback):
+                return None
+        with pipeline_stage("render", progress_callback):
+            if progress_callback:
+                progress_callback("rendering", None, None, "Creating HTML")
+            convert_txt_to_html(formatted_file_path, html_file_path, base_file_name, css_file_path)
+        index_transcript_file(html_file_path, f"{name}_{key}", base_file_name, formatted_file_path)
     else:
-        convert_txt_to_html(file_path, html_file_path, base_file_name, css_file_path)
+        with pipeline_stage("render", progress_callback):
+            if progress_callback:
+                progress_callback("rendering", None, None, "Creating HTML")
+            convert_txt_to_html(file_path, html_file_path, base_file_name, css_file_path)
+        index_transcript_file(html_file_path, f"{name}_{key}", base_file_name, file_path)
         
     return html_file_path
 
 # Transcribe and format audio/video files with Whisper AI and GPT-4 does not convert to .html
-def transcribe_and_save(file_paths, openai_api_key):
+def transcribe_and_save(file_paths, openai_api_key, progress_callback=None, format_progress_callback=None, manifest=None, backend=DEFAULT_TRANSCRIPTION_BACKEND):
+    """
+    Transcribes the parts, combines them and writes the GPT-formatted transcript.
+
+    :param backend: Name of the transcription backend, "openai" or "local".
+
+    :param progress_callback: Optional callable(part_index, total_parts, part_path, transcription).
+    :param format_progress_callback: Optional callable(stage, done, total, message, output_path=None)
+        for the formatting stage.
+    :return: Path to the formatted transcript, or None on failure.
+    """
     logging.debug(f"Transcribing file: {file_paths}")
-    combined_transcription = ''
-    for part_path in file_paths:
-        print(f"Transcribing file: {part_path}")
-        transcription = call_whisper_api(part_path, openai_api_key)
-        print(f"Transcription: {transcription}")
-        if transcription:
-            combined_transcription += transcription + "\n"  # Add a new line between parts
-        else:
-            logging.error(f"Failed to transcribe file part: {part_path}")
-            return None  # Or handle the error as appropriate
+    if not file_paths:
+        return None
+    manifest = manifest or load_manifest(f"parts:{file_paths[0]}", file_paths[0])
+    transcription_backend = get_transcription_backend(backend, openai_api_key)
+    backend_params = {'model': transcription_backend.model}
     combined_transcription_filename = os.path.splitext(file_paths[0])[0] + "_combined.txt"  # Assuming file_paths[0] is the base name
-    with open(combined_transcription_filename, "w") as text_file:
-        text_file.write(combined_transcription)
+    output_filename = os.path.splitext(file_paths[0])[0] + "_formatted.txt"
+
+    # Resume from the formatted or combined text if an earlier run got that far
+    formatted_checkpoint = get_checkpoint(manifest, "formatted")
+    if formatted_checkpoint is not None:
+        return formatted_checkpoint
+    combined_checkpoint = get_checkpoint(manifest, "combined", params=backend_params)
+    if combined_checkpoint is not None:
+        combined_transcription = read_text_file(combined_checkpoint)
+    else:
+        # Parts transcribed by an earlier run are kept; only the missing ones are sent
+        transcriptions = [None] * len(file_paths)
+        for index, part_path in enumerate(file_paths):
+            transcript_path = get_checkpoint(manifest, f"transcript:{part_path}", params=backend_params)
+            if transcript_path is not None:
+                transcriptions[index] = read_file_content(transcript_path)
+        missing = [index for index, transcription in enumerate(transcriptions) if transcription is None]
+
+        def on_part(subset_index, subset_total, part_path, transcription):
+            index = missing[subset_index]
+            if transcription is not None:
+                transcript_path = part_path + ".transcript.txt"
+                with open(transcript_path, "w", encoding="utf-8") as text_file:
+                    text_file.write(transcription)
+                set_checkpoint(manifest, f"transcript:{part_path}", transcript_path, files=[transcript_path], params=backend_params)
+            if progress_callback:
+                progress_callback(index, len(file_paths), part_path, transcription)
+
+        # Send the parts to the backend in parallel; results come back in part order
+        with pipeline_stage("transcribe", format_progress_callback):
+            missing_transcriptions = transcribe_parts_concurrently([file_paths[index] for index in missing], transcription_backend, progress_callback=on_part)
+        for index, transcription in zip(missing, missing_transcriptions):
+            transcriptions[index] = transcription
+        failed_parts = [part_path for part_path, transcription in zip(file_paths, transcriptions) if transcription is None]
+        if failed_parts:
+            for part_path in failed_parts:
+                logging.error(f"Failed to transcribe file part: {part_path}")
+            return None  # Finished parts are checkpointed, a re-run only retries these
+        combined_transcription = "\n".join(transcriptions) + "\n"  # Add a new line between parts
+        with open(combined_transcription_filename, "w") as text_file:
+            text_file.write(combined_transcription)
+        set_checkpoint(manifest, "combined", combined_transcription_filename, files=[combined_transcription_filename], params=backend_params)
         
     if combined_transcription:
-        formatted_transcription = reformat_transcript_with_gpt4(combined_transcription, openai_api_key)
-        output_filename = os.path.splitext(file_paths[0])[0] + "_formatted.txt"
-            
-        with open(output_filename, "w") as text_file:
-            text_file.write(formatted_transcription)
+        with pipeline_stage("format", format_progress_callback):
+            if not write_formatted_transcript(combined_transcription, openai_api_key, output_filename, progress_callback=format_progress_callback):
+                return None
+        set_checkpoint(manifest, "formatted", output_filename, files=[output_filename])
                 
         return output_filename
             
     return None
 
-# Process Audio/Video Files in streamlit component
-def process_audio_video_files(file_path, name, key, css_file_path, openai_api_key):
-    logging.info(f"Processing file: {os.path.basename(file_path)}")
+# Reformat a transcript into output_filename, streaming it to disk when STREAM_FORMATTING is on
+def write_formatted_transcript(raw_transcription, openai_api_key, output_filename, progress_callback=None):
+    """
+    Writes the GPT-formatted transcript to output_filename.
+
+    In streaming mode every fragment is flushed to the file as it arrives, so the job
+    panel can render the text while it is generated and a dropped connection keeps
+    the partial text on disk.
+
+    :return: True if the complete formatted transcript was written.
+    """
+    _, on_window = stage_progress_callbacks(progress_callback)
+    if not STREAM_FORMATTING:
+        formatted_text = reformat_transcript_with_gpt4(raw_transcription, openai_api_key, progress_callback=on_window)
+        if formatted_text is None:
+            return False
+        with open(output_filename, "w") as text_file:
+            text_file.write(formatted_text)
+        return True
+
+    if progress_callback:
+        progress_callback("formatting", None, None, "Streaming formatted text", output_path=output_filename)
+    try:
+        with open(output_filename, "w") as text_file:
+            for fragment in stream_reformat_transcript(raw_transcription, openai_api_key):
+                text_file.write(fragment)
+                text_file.flush()
+    except (requests.RequestException, RuntimeError, ValueError) as e:
+        logging.error(f"Formatting stream interrupted, partial text kept in {output_filename}: {e}")
+        return False
+    return True
+
+# Adapt per-part and per-window callbacks to a single progress_callback(stage, done, total, message)
+def stage_progress_callbacks(progress_callback):
+    if progress_callback is None:
+        return None, None
+    completed = {'parts': 0, 'windows': 0}
+
+    def on_part(part_index, total_parts, part_path, transcription):
+        completed['parts'] += 1
+        if transcription is not None:
+            message = f"Transcribed part {part_index + 1} of {total_parts}"
+        else:
+            message = f"Failed to transcribe part {part_index + 1} of {total_parts}: {os.path.basename(part_path)}"
+        progress_callback("transcribing", completed['parts'], total_parts, message)
+
+    def on_window(window_index, total_windows, metrics):
+        completed['windows'] += 1
+        progress_callback(
+            "formatting", completed['windows'], total_windows,
+            f"Formatted window {window_index + 1} of {total_windows} in {metrics['latency_seconds']}s "
+            f"({metrics['prompt_tokens']} prompt / {metrics['completion_tokens']} completion tokens)",
+        )
+
+    return on_part, on_window
+
+# Run the audio pipeline for a downloaded or uploaded file, resuming from its checkpoints
+def run_audio_pipeline(file_path, name, key, css_file_path, openai_api_key, manifest, progress_callback=None, backend=DEFAULT_TRANSCRIPTION_BACKEND, work_directory=None):
     # Extract the filename from the path
     filename = os.path.basename(file_path)
+    title = os.path.splitext(filename)[0]
+    user_processed_folder = os.path.join(PROCESSED_DIRECTORY, f"{name}_{key}", 'html')
+    html_file_path = os.path.join(user_processed_folder, title + ".html")
+
+    # The whole run already finished with the same stylesheet
+    if get_checkpoint(manifest, "html", params={'css': css_file_path}) is not None:
+        return html_file_path
+
     # Process the file - convert video to audio, split if necessary
-    file_paths_to_process = process_audio_video_file(file_path, filename)
+    audio_path = get_checkpoint(manifest, "audio")
+    file_paths_to_process = get_checkpoint(manifest, "parts")
+    if audio_path is None or file_paths_to_process is None:
+        # ffmpeg work holds a media slot only, so other files can use the API meanwhile
+        with pipeline_stage("media", progress_callback):
+            if progress_callback:
+                progress_callback("preparing audio", None, None, "Extracting and splitting audio")
+            if audio_path is None:
+                # Intermediate files go to the job's own folder when the source may be shared
+                audio_path = precondition_audio(file_path, output_directory=work_directory)
+                if audio_path is None:
+                    logging.error(f"Could not extract audio from file: {filename}")
+                    return None
+                set_checkpoint(manifest, "audio", audio_path, files=[audio_path])
+                file_paths_to_process = None
+            if file_paths_to_process is None:
+                file_paths_to_process = split_for_transcription(audio_path, filename)
+                set_checkpoint(manifest, "parts", file_paths_to_process, files=file_paths_to_process)
     
     # Transcribe and format the audio files
-    transcription_filename = transcribe_and_save(file_paths_to_process, openai_api_key)
+    on_part, _ = stage_progress_callbacks(progress_callback)
+    transcription_filename = transcribe_and_save(file_paths_to_process, openai_api_key, progress_callback=on_part, format_progress_callback=progress_callback, manifest=manifest, backend=backend)
     
     if transcription_filename:
         # Save the formatted transcription in the user-specific processed folder
-        user_processed_folder = os.path.join(PROCESSED_DIRECTORY, f"{name}_{key}", 'html')
         ensure_directory_exists(user_processed_folder)
 
         # Construct the full path for the processed file
         processed_file_path = os.path.join(user_processed_folder, os.path.basename(transcription_filename))
         
-        # Move or copy the file to the user-specific processed folder
-        shutil.move(transcription_filename, processed_file_path)
+        # Move or copy the file to the user-specific processed folder; files outside the
+        # user's upload folder are copied so nobody else loses them
+        if transcription_filename != processed_file_path:
+            if is_within_directory(transcription_filename, os.path.join(UPLOAD_DIRECTORY, f"{name}_{key}")):
+                shutil.move(transcription_filename, processed_file_path)
+            else:
+                shutil.copyfile(transcription_filename, processed_file_path)
+            set_checkpoint(manifest, "formatted", processed_file_path, files=[processed_file_path])
 
         logging.info(f"Processed file saved: {processed_file_path}")
         # Convert the transcript to HTML and save in the same folder
-        title = os.path.splitext(filename)[0]
-        html_file_path = os.path.join(user_processed_folder, title + ".html")
-        convert_txt_to_html(processed_file_path, html_file_path, title, css_file_path)
+        with pipeline_stage("render", progress_callback):
+            if progress_callback:
+                progress_callback("rendering", None, None, "Creating HTML")
+            convert_txt_to_html(processed_file_path, html_file_path, title, css_file_path)
+        index_transcript_file(html_file_path, f"{name}_{key}", title, processed_file_path)
+        set_checkpoint(manifest, "html", html_file_path, files=[html_file_path], params={'css': css_file_path})
         logging.info(f"HTML file created: {html_file_path}")
 
         return html_file_path
     else:
-        logging.error(f"Failed to process file: {os.path.basename(file_path)}")
+        logging.error(f"Failed to process file: {filename}")
         return None
 
+# Check whether a path lies inside a directory
+def is_within_directory(path, directory):
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(directory)]) == os.path.abspath(directory)
+
+# Process Audio/Video Files in streamlit component
+def process_audio_video_files(file_path, name, key, css_file_path, openai_api_key, progress_callback=None, backend=DEFAULT_TRANSCRIPTION_BACKEND):
+    logging.info(f"Processing file: {os.path.basename(file_path)}")
+    manifest = load_manifest(file_path, file_path)
+    return run_audio_pipeline(file_path, name, key, css_file_path, openai_api_key, manifest, progress_callback=progress_callback, backend=backend)
+
 
 # Modify the handle_file_upload function to organize files into directories
 def handle_file_upload(uploaded_file, name="jhondoe_asu", key="jhondoekey_asu"):
+    from werkzeug.utils import secure_filename
     # Secure the filename and construct the full path
     filename = secure_filename(uploaded_file.name)
-    # Check for duplicates and save the file
-    temp_file = uploaded_file.read()
-    file_hash = calculate_file_hash(temp_file)
-    
     # Create user-specific folder based on name and key
     user_folder_name = f"{name}_{key}"
     user_upload_folder = os.path.join(UPLOAD_DIRECTORY, user_folder_name)
@@ -165,26 +297,29 @@ def handle_file_upload(uploaded_file, name="jhondoe_asu", key="jhondoekey_asu"):
     file_extension = uploaded_file.name.rsplit('.', 1)[-1].lower()
     file_type_folder = os.path.join(user_upload_folder, file_extension)
     ensure_directory_exists(file_type_folder)
+
+    # Hash and save the file in one pass, then check for duplicates
+    temp_file_path, file_hash = save_upload_to_temp_file(uploaded_file, file_type_folder)
+    file_path = os.path.join(file_type_folder, filename)
     
-    if file_hash in read_hashes_from_csv():
+    if not claim_file_hash(file_hash, filename, user=user_folder_name, file_path=file_path, size=os.path.getsize(temp_file_path)):
+        os.remove(temp_file_path)
         logging.info(f"Duplicate file detected, skipped: {filename}")
         st.toast(f"Duplicate file detected, skipped: {filename}", icon="❌")
         return None  # Return None to indicate no further action is needed
     else:
-        file_path = os.path.join(file_type_folder, filename)
-        with open(file_path, 'wb') as f:
-            f.write(temp_file)
-        write_hash_to_csv(file_hash, filename)
+        os.replace(temp_file_path, file_path)  # Atomic rename, readers never see a partial file
         return file_path
 
 
 # Process Text Files
-def process_text_file(file_path, format_with_gpt, css_file_path, name, key, openai_api_key):
+def process_text_file(file_path, format_with_gpt, css_file_path, name, key, openai_api_key, progress_callback=None):
     """
     Process the text file.
 
     :param file_path: Path to the text file to be processed.
     :param format_with_gpt: Boolean indicating whether to format with GPT-4.
+    :param progress_callback: Optional callable(stage, done, total, message).
     :return: Path to the processed HTML file.
     """
     # Call the format_text_file function to process and convert the text file
@@ -194,47 +329,158 @@ def process_text_file(file_path, format_with_gpt, css_file_path, name, key, open
         openai_api_key=openai_api_key,
         css_file_path=css_file_path,
         name=name,
-        key=key)
+        key=key,
+        progress_callback=progress_callback)
 
     return processed_html_file_path
 
-def process_youtube_video(youtube_url, name, key, css_file_path, openai_api_key):
-    file_path = download_youtube_video(youtube_url, download_folder)
-    filename = os.path.basename(file_path)
-    # Download the youtube video
-    # Extract audio from the video
-    file_paths_to_process = process_audio_video_file(file_path, filename)
-    
-    # Transcribe and format the audio files
-    transcription_filename = transcribe_and_save(file_paths_to_process, openai_api_key)
-    
-    if transcription_filename:
-        # Save the formatted transcription in the user-specific processed folder
-        user_processed_folder = os.path.join(PROCESSED_DIRECTORY, f"{name}_{key}", 'html')
-        ensure_directory_exists(user_processed_folder)
-
-        # Construct the full path for the processed file
-        processed_file_path = os.path.join(user_processed_folder, os.path.basename(transcription_filename))
-        
-        # Move or copy the file to the user-specific processed folder
-        shutil.move(transcription_filename, processed_file_path)
-        
-        logging.info(f"Processed file saved: {processed_file_path}")
-        # Convert the transcript to HTML and save in the same folder
-        title = os.path.splitext(filename)[0]
-        html_file_path = os.path.join(user_processed_folder, title + ".html")
-        convert_txt_to_html(processed_file_path, html_file_path, title, css_file_path)
-        logging.info(f"HTML file created: {html_file_path}")
-
-        return html_file_path
+def process_youtube_video(youtube_url, name, key, css_file_path, openai_api_key, progress_callback=None, backend=DEFAULT_TRANSCRIPTION_BACKEND, job_id=None):
+    # Each user gets their own manifest; another user's checkpoints point at files they own
+    manifest = load_manifest(f"youtube:{name}_{key}:{youtube_url}")
+    # Each job downloads and works in its own folder, so concurrent jobs on the same video never share files
+    work_directory = os.path.join(UPLOAD_DIRECTORY, f"{name}_{key}", "youtube", str(job_id or uuid.uuid4().hex))
+    # Download only the audio of the youtube video, hashing it on the way to disk
+    file_path = get_checkpoint(manifest, "download")
+    if file_path is None:
+        with pipeline_stage("download", progress_callback):
+            if progress_callback:
+                progress_callback("downloading", None, None, f"Downloading audio of {youtube_url}")
+            downloaded = download_youtube_audio(youtube_url, work_directory)
+        if downloaded is None:
+            logging.error(f"Failed to download youtube audio: {youtube_url}")
+            return None
+        file_path, file_hash, file_size = downloaded
+        user_folder_name = f"{name}_{key}"
+        if not claim_file_hash(file_hash, os.path.basename(file_path), user=user_folder_name, file_path=file_path, size=file_size):
+            # The same audio was ingested before; reuse that copy and its transcript
+            existing = get_file_hash_entry(file_hash)
+            if existing and existing['file_path'] and existing['file_path'] != file_path and os.path.exists(existing['file_path']):
+                os.remove(file_path)
+                file_path = existing['file_path']
+            logging.info(f"Duplicate youtube audio detected: {youtube_url}")
+            existing_html_path = os.path.join(PROCESSED_DIRECTORY, user_folder_name, 'html', os.path.splitext(os.path.basename(file_path))[0] + ".html")
+            if existing and existing['user'] == user_folder_name and os.path.exists(existing_html_path):
+                if progress_callback:
+                    progress_callback("done", 1, 1, "Already transcribed")
+                return existing_html_path
+        set_checkpoint(manifest, "download", file_path, files=[file_path])
+    # Extract audio, transcribe, format and convert to HTML
+    ensure_directory_exists(work_directory)
+    return run_audio_pipeline(file_path, name, key, css_file_path, openai_api_key, manifest, progress_callback=progress_callback, backend=backend, work_directory=work_directory)
+
+
+# Background job handlers; they run on the job worker threads, outside any streamlit session
+def run_audio_video_job(payload, report, openai_api_key):
+    reservation_id = payload.get('credit_reservation')
+    try:
+        result = process_audio_video_files(payload['file_path'], name=payload['name'], key=payload['key'], css_file_path=payload['css_file_path'], openai_api_key=openai_api_key, progress_callback=report, backend=payload.get('backend', DEFAULT_TRANSCRIPTION_BACKEND))
+    except Exception:
+        if reservation_id:
+            release_credits(reservation_id)
+        raise
+    if reservation_id:
+        settle_job_credits(reservation_id, payload['file_path'], result)
+    return result
+
+# Charge a finished job for the media it processed, or refund its hold if it failed
+def settle_job_credits(reservation_id, file_path, result):
+    if not result:
+        release_credits(reservation_id)
+        return
+    try:
+        actual_duration = get_file_duration(file_path)
+    except Exception:
+        actual_duration = None  # Charge the reserved estimate
+    commit_credits(reservation_id, actual_duration)
+
+def run_text_job(payload, report, openai_api_key):
+    return process_text_file(payload['file_path'], payload['format_with_gpt'], css_file_path=payload['css_file_path'], name=payload['name'], key=payload['key'], openai_api_key=openai_api_key, progress_callback=report)
+
+def run_youtube_job(payload, report, openai_api_key):
+    return process_youtube_video(payload['youtube_url'], payload['name'], payload['key'], payload['css_file_path'], openai_api_key, progress_callback=report, backend=payload.get('backend', DEFAULT_TRANSCRIPTION_BACKEND), job_id=payload.get('job_id'))
+
+# Register the job handlers and start this server process's job workers; cached, so
+# reruns and new sessions skip it after the first call in a process
+@st.cache_resource(show_spinner=False)
+def start_background_workers(openai_api_key):
+    ensure_directory_exists(UPLOAD_DIRECTORY)
+    ensure_directory_exists(PROCESSED_DIRECTORY)
+    register_job_handler("audio_video", partial(run_audio_video_job, openai_api_key=openai_api_key))
+    register_job_handler("text", partial(run_text_job, openai_api_key=openai_api_key))
+    register_job_handler("youtube", partial(run_youtube_job, openai_api_key=openai_api_key))
+    start_job_workers()
+    # Load the tokenizer in the background so the first upload estimate does not wait for it
+    threading.Thread(target=warm_up_encoding, name="warm-up-encoding", daemon=True).start()
+    return True
+
+def warm_up_encoding():
+    try:
+        get_encoding()
+    except Exception as e:
+        logging.warning(f"Could not preload the tokenizer: {e}")
+
+# Show the user's recent jobs; reruns on its own to poll their progress
+def show_job_status(name, key):
+    jobs = list_jobs(f"{name}_{key}")
+    if not jobs:
+        return
+    st.subheader("Jobs")
+    # Load of each pipeline stage across all users' jobs in this server process
+    stage_load = [f"{stage} {metrics['active']}/{metrics['limit']}" + (f" (+{metrics['waiting']} waiting)" if metrics['waiting'] else "")
+                  for stage, metrics in pipeline_stage_metrics().items()]
+    st.caption("Pipeline: " + " · ".join(stage_load))
+    for job in jobs:
+        col1, col2 = st.columns([3, 5])
+        with col1:
+            st.text(job['title'])
+        with col2:
+            status_text = f"{job['state']} · {job['stage']}"
+            if job['message']:
+                status_text += f" · {job['message']}"
+            st.progress(min(max(job['progress'], 0.0), 1.0), text=status_text)
+            # Render streamed formatting output while it is being written
+            if job['state'] == "running" and job['stage'] == "formatting" and job['result']:
+                partial_text = read_file_tail(job['result'])
+                if partial_text:
+                    with st.expander("Live output", expanded=True):
+                        st.text(partial_text)
+
+if hasattr(st, "fragment"):
+    show_job_status = st.fragment(run_every=JOB_STATUS_REFRESH_SECONDS)(show_job_status)
+
+# Show the estimated audio minutes, tokens and cost of the selected uploads
+def show_batch_estimate(uploaded_files, format_with_gpt):
+    try:
+        estimate = estimate_uploads(uploaded_files, format_with_gpt)
+    except Exception as e:
+        logging.error(f"Error estimating batch: {e}")
+        st.caption("Estimate unavailable.")
+        return
+    totals = estimate['totals']
+    st.dataframe(estimate['items'], use_container_width=True, hide_index=True)
+    st.caption(
+        f"Estimated total: {totals['audio_minutes']} audio minutes, {int(totals['prompt_tokens'])} prompt tokens, "
+        f"{int(totals['completion_tokens'])} completion tokens, ${totals['estimated_cost']:.2f}"
+    )
+
+# Work out which stylesheet the user chose
+def resolve_css_file_path(uploaded_css_file, selected_css_option, css_file_path, name, key):
+    if uploaded_css_file:
+        css_file_path = handle_file_upload(uploaded_css_file, name, key)
+        print(css_file_path)
+        st.toast(f"CSS file uploaded: {css_file_path}")
+    elif selected_css_option != "None":
+        css_file_path = os.path.join(UPLOAD_DIRECTORY, f"{name}_{key}", "css", selected_css_option)
+        print(css_file_path)
+    elif css_file_path is not None and os.path.exists(css_file_path):
+        css_file_path = os.path.join(UPLOAD_DIRECTORY, f"{name}_{key}", "css", "default.css")
+        print(css_file_path)
     else:
-        logging.error(f"Failed to process file: {os.path.basename(file_path)}")
-        return None
-    
-    return None
-
+        css_file_path = "https://assets.ea.asu.edu/ulc/css/stylesheet.css"
+    return css_file_path
 
 def transcription_functionality(name, key, credit_on, openai_api_key):
+    start_background_workers(openai_api_key)
     css_file_path = None
     selected_css_option = None
     # File Upload Section with improved spacing and layout
@@ -244,15 +490,21 @@ def transcription_functionality(name, key, credit_on, openai_api_key):
                 
                 with col1:
                     st.write("Upload text, audio, or video files to process.")
-                    uploaded_files = st.file_uploader("Drag and drop files here", accept_multiple_files=True, type=['txt', 'mp3', 'mp4', 'vtt'], help="Limit 200MB per file")
+                    uploaded_files = st.file_uploader("Drag and drop files here", accept_multiple_files=True, type=['txt', 'mp3', 'mp4', 'vtt', 'srt'], help="Limit 200MB per file")
                     format_with_gpt = st.checkbox("Format with GPT-4", value=False, help="Format the transcript with GPT-4 to improve readability.")
+                    if uploaded_files:
+                        show_batch_estimate(uploaded_files, format_with_gpt)
+                    backends = available_transcription_backends()
+                    backend = st.selectbox("Transcription backend", backends, index=backends.index(DEFAULT_TRANSCRIPTION_BACKEND), help="openai sends audio to the Whisper API; local transcribes on this server's CPU with faster-whisper.")
                 with col2:
                     st.write("Process a youtube video.")
                     youtube_url = st.text_input("Enter the youtube url")
-                    if st.button("Process Youtube Video", key="process_youtube_video"):
+                    if st.button("Process Youtube Video", key="process_youtube_video") and youtube_url:
                         css_file_path = "https://assets.ea.asu.edu/ulc/css/stylesheet.css"
-                        process_youtube_video(youtube_url, name, key, css_file_path, openai_api_key)
-                        st.toast(f"Finished processing youtube video: {youtube_url}", icon="🎉")
+                        enqueue_job(f"{name}_{key}", "youtube", youtube_url, {
+                            'youtube_url': youtube_url, 'name': name, 'key': key, 'css_file_path': css_file_path, 'backend': backend,
+                        })
+                        st.toast(f"Queued youtube video: {youtube_url}", icon="🎉")
                     else:
                         st.error("No youtube url entered.")
 
@@ -262,85 +514,135 @@ def transcription_functionality(name, key, credit_on, openai_api_key):
                 css_files = list_css_files(name, key)
                 css_options = ["None"] + css_files
                 selected_css_option = st.selectbox("Select a CSS file", css_options, index=0, help="Select a CSS file to apply to the transcript.")  
+                if st.button("Apply to existing transcripts", help="Re-render all of your HTML transcripts with this stylesheet. Nothing is transcribed or formatted again."):
+                    rerender_css_file_path = resolve_css_file_path(uploaded_css_file, selected_css_option, css_file_path, name, key)
+                    with st.spinner("Re-rendering transcripts..."):
+                        rendered, failures = rerender_html_directory(os.path.join(PROCESSED_DIRECTORY, f"{name}_{key}", "html"), rerender_css_file_path)
+                    st.success(f"Re-rendered {rendered} transcripts")
+                    for html_file_path, error in failures:
+                        st.error(f"Could not re-render {os.path.basename(html_file_path)}: {error}")
     
     if st.button("Process Files", key="process_files"):
-        with st.status("Processing files..."):
+        with st.status("Queueing files..."):
             # Handle CSS file upload and path retrieval
-            if uploaded_css_file:
-                css_file_path = handle_file_upload(uploaded_css_file, name, key)
-                print(css_file_path)
-                st.toast(f"CSS file uploaded: {css_file_path}")
-            elif selected_css_option != "None":
-                css_file_path = os.path.join(UPLOAD_DIRECTORY, f"{name}_{key}", "css", selected_css_option)
-                print(css_file_path)
-            elif css_file_path is not None and os.path.exists(css_file_path):
-                css_file_path = os.path.join(UPLOAD_DIRECTORY, f"{name}_{key}", "css", "default.css")
-                print(css_file_path)
-            else:
-                css_file_path = "https://assets.ea.asu.edu/ulc/css/stylesheet.css"
+            css_file_path = resolve_css_file_path(uploaded_css_file, selected_css_option, css_file_path, name, key)
                 
             if not uploaded_files:
                 st.error("No files selected.")
             else:
+                audio_video_extensions = ['.mp3', '.mp4', '.wav', '.avi', '.mov', '.flac']
                 for uploaded_file in uploaded_files:
-                    if credit_on:
-                        file_duration = get_file_duration(uploaded_file)
-                        # Check and potentially deduct credits
-                        credits_ok, message = check_and_deduct_credits(name, key, file_duration)
-                        if credits_ok:
-                            # If credits check out, process the file
-                            st.success("Credits processed successfully")
-                        else:
-                            # If there is an issue with credits, display an error
-                            st.error(message)
+                    extension = os.path.splitext(uploaded_file.name)[1].lower()
+                    reservation_id = None
+                    if credit_on and extension in audio_video_extensions:
+                        # Hold the estimated credits; the job charges what it actually used when it finishes
+                        try:
+                            file_duration = get_file_duration(uploaded_file)
+                        except Exception:
+                            st.error(f"Could not read the duration of {uploaded_file.name}; it was not processed.")
+                            continue
+                        reservation_id, message = reserve_credits(name, key, file_duration, reference=uploaded_file.name)
+                        if reservation_id is None:
+                            # If there is an issue with credits, display an error and skip the file
+                            st.error(f"{uploaded_file.name}: {message}")
+                            continue
+                        st.success("Credits reserved successfully")
                     print(uploaded_file.name)
                     st.write(f"Uploading file: {uploaded_file.name}")
                     file_path = handle_file_upload(uploaded_file, name=name, key=key)
                     print(file_path)
+                    if file_path is None:
+                        if reservation_id is not None:
+                            release_credits(reservation_id)
+                        continue
                     
-                    audio_video_extensions = ['.mp3', '.mp4', '.wav', '.avi', '.mov', '.flac']
                     extension = os.path.splitext(file_path)[1]
+                    payload = {'file_path': file_path, 'name': name, 'key': key, 'css_file_path': css_file_path, 'backend': backend}
                 
-                    if extension == ".txt" and file_path is not None:
-                        st.write(f"Processing text file: {file_path}")
-                        process_text_file(file_path, format_with_gpt, css_file_path=css_file_path, name=name, key=key, openai_api_key=openai_api_key)
-                    elif extension == ".vtt" and file_path is not None:
-                        st.write(f"Processing vtt file: {file_path}")
-                        process_text_file(file_path, format_with_gpt, css_file_path=css_file_path, name=name, key=key, openai_api_key=openai_api_key)
-                        st.write(f"Finished processing text file: {file_path}")
-                    elif extension in audio_video_extensions and file_path is not None:
-                        st.write(f"Processing audio/video file: {file_path}")
-                        process_audio_video_files(file_path, name=name, key=key, css_file_path=css_file_path, openai_api_key=openai_api_key)
-                        st.write(f"Finished processing audio/video file: {file_path}")
+                    # Processing runs on the background job workers; the page only polls for progress
+                    if extension == ".txt" or extension in CAPTION_EXTENSIONS:
+                        payload['format_with_gpt'] = format_with_gpt
+                        enqueue_job(f"{name}_{key}", "text", uploaded_file.name, payload)
+                        st.write(f"Queued text file: {file_path}")
+                    elif extension in audio_video_extensions:
+                        payload['credit_reservation'] = reservation_id
+                        enqueue_job(f"{name}_{key}", "audio_video", uploaded_file.name, payload)
+                        st.write(f"Queued audio/video file: {file_path}")
+
+    show_job_status(name, key)
                         
+# Render one row of the file list; file bytes are read only once a download is requested
+def render_file_row(file, file_title, bg_color, snippet=None):
+    with st.container():
+        st.markdown(f'<div style="background-color: {bg_color}; padding: 5px;">', unsafe_allow_html=True)
+        col1, col2, col3, col4 = st.columns([3, 3, 1, 1])
+
+        with col1:
+            st.text(file['name'])
+        with col2:
+            st.text(file_title)
+            if snippet:
+                st.markdown(snippet, unsafe_allow_html=True)
+
+        with col3:
+            if st.session_state.get('download_requested') == file['path']:
+                # Download button
+                with open(file['path'], 'rb') as f:
+                    st.download_button("💾", f.read(), file_name=file['name'], mime="text/plain", key=f"download_{file['path']}")
+            elif st.button("⬇️", key=f"prepare_download_{file['path']}"):
+                st.session_state['download_requested'] = file['path']
+                st.rerun()
+
+        with col4:
+            # Delete button
+            if st.button("❌", key=f"delete_{file['path']}"):
+                delete_file(file['path'])
+                delete_hash_for_path(file['path'])
+                remove_document(file['path'])
+                st.rerun()
+
+        st.markdown('</div>', unsafe_allow_html=True)
+
+# Page selector below a paginated list
+def page_selector(page_count, state_key):
+    if page_count <= 1:
+        return 1
+    return st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, key=state_key)
+
 def file_management(page, name, key):
     # File Management Section with search and sort, without using a table
     if page == "Current Functionality":
         with st.container():
             user_processed_folder = os.path.join(PROCESSED_DIRECTORY, f"{name}_{key}", 'html')
-            print(user_processed_folder)
             user_uploaded_folder = os.path.join(UPLOAD_DIRECTORY, f"{name}_{key}")
-            files = get_file_details(list_files(user_processed_folder))
-            uploaded_files = get_file_details(list_files(user_uploaded_folder))
+            # Uploads first, then processed files, as before; the index is cached between reruns
+            uploaded_files = get_file_index(user_uploaded_folder)
+            files = get_file_index(user_processed_folder)
             col1, col2, col3 = st.columns([3, 4, 3])
             with col1:
                 st.header("File Management")
             with col2:
                 # Enhanced real-time search functionality
                 search_query = st.text_input("Search files")
-                if search_query:
-                    files = [file for file in files if search_query.lower() in file['name'].lower()]
+                search_contents = st.checkbox("Search inside transcripts", help="Find transcripts that mention every word you type, best matches first.")
             with col3:
                 # Sort options
                 sort_option = st.selectbox("Sort by", ["Name", "Date Modified", "Size"], index=0)
 
-            # Sort files based on the selected option
-            if sort_option == "Name":
-                files.sort(key=lambda x: x['name'].lower())
-            elif sort_option == "Date Modified":
-                files.sort(key=lambda x: x['mtime'], reverse=True)
-            elif sort_option == "Size":
-                files.sort(key=lambda x: x['size'], reverse=True)
+            if search_contents and search_query:
+                # Transcripts published before the search index existed are indexed on first use
+                index_missing_documents(f"{name}_{key}", files)
+                files_by_path = {file['path']: file for file in files}
+                rows = [
+                    (files_by_path[hit['path']], hit['title'], hit['snippet'])
+                    for hit in search_transcripts(f"{name}_{key}", search_query)
+                    if hit['path'] in files_by_path
+                ]
+            else:
+                rows = [(file, clean_title(file['name']), None) for file in filter_and_sort_files(uploaded_files, search_query, sort_option)]
+                rows += [(file, clean_title(os.path.splitext(file['name'])[0]), None) for file in filter_and_sort_files(files, search_query, sort_option)]
+            page_number = st.session_state.get('file_management_page', 1)
+            page_rows, page_number, page_count = paginate(rows, page_number, FILE_PAGE_SIZE)
 
             # Create table headers with some styling
             header1, header2, header3, header4 = st.columns([3, 3, 1, 1])
@@ -351,105 +653,55 @@ def file_management(page, name, key):
 
             # Alternate row color for better readability
             bg_color = "#f0f2f6"
-            
-            for file in uploaded_files:
-                file_name = file['name']
-                file_title = clean_title(file_name)
-
-                # Apply alternate row color
+            for file, file_title, snippet in page_rows:
                 bg_color = "#e0e2f6" if bg_color == "#f0f2f6" else "#f0f2f6"
-                with st.container():
-                    st.markdown(f'<div style="background-color: {bg_color}; padding: 5px;">', unsafe_allow_html=True)
-                    col1, col2, col3, col4 = st.columns([3, 3, 1, 1])
-
-                    with col1:
-                        st.text(file_name)
-                    with col2:
-                        st.text(file_title)
-
-                    with col3:
-                        # Download button
-                        with open(file['path'], 'rb') as f:
-                            st.download_button("⬇️", f.read(), file_name=file_name, mime="text/plain", key=f"download_{file_name}")
-
-                    with col4:
-                        # Delete button
-                        if st.button("❌", key=f"delete_{file_name}"):
-                            delete_file(file['path'])
-                            delete_hash_from_csv()
-                            st.rerun()
-
-                    st.markdown('</div>', unsafe_allow_html=True)
-
-            for file in files:
-                file_name = file['name']
-                file_title = clean_title(os.path.splitext(file_name)[0])
-
-                # Apply alternate row color
-                bg_color = "#e0e2f6" if bg_color == "#f0f2f6" else "#f0f2f6"
-                with st.container():
-                    st.markdown(f'<div style="background-color: {bg_color}; padding: 5px;">', unsafe_allow_html=True)
-                    col1, col2, col3, col4 = st.columns([3, 3, 1, 1])
-
-                    with col1:
-                        st.text(file_name)
-                    with col2:
-                        st.text(file_title)
-
-                    with col3:
-                        # Download button
-                        with open(file['path'], 'rb') as f:
-                            st.download_button("⬇️", f.read(), file_name=file_name, mime="text/plain", key=f"download_{file_name}")
-
-                    with col4:
-                        # Delete button
-                        if st.button("❌", key=f"delete_{file_name}"):
-                            delete_file(file['path'])
-                            delete_hash_from_csv()
-                            st.rerun()
-
-                    st.markdown('</div>', unsafe_allow_html=True)
+                render_file_row(file, file_title, bg_color, snippet)
+
+            if page_count > 1:
+                st.session_state['file_management_page'] = page_number
+                page_selector(page_count, 'file_management_page')
+            st.caption(f"{len(rows)} files")
                     
     elif page == "File Preview":
         with st.container():
             user_processed_folder = os.path.join(PROCESSED_DIRECTORY, f"{name}_{key}", 'html')
-            files = get_file_details(list_files(user_processed_folder))
+            files = get_file_index(user_processed_folder)
             col1, col2 = st.columns([3, 4])
             with col1:
                 # Enhanced real-time search functionality
                 search_query = st.text_input("Search files")
-                if search_query:
-                    files = [file for file in files if search_query.lower() in file['name'].lower()]
             with col2:
                 # Sort options
                 sort_option = st.selectbox("Sort by", ["Name", "Date Modified", "Size"], index=0)
+            files = filter_and_sort_files(files, search_query, sort_option)
+            page_files, page_number, page_count = paginate(files, st.session_state.get('preview_list_page', 1), FILE_PAGE_SIZE)
 
-            # Sort files based on the selected option
-            if sort_option == "Name":
-                files.sort(key=lambda x: x['name'].lower())
-            elif sort_option == "Date Modified":
-                files.sort(key=lambda x: x['mtime'], reverse=True)
-            elif sort_option == "Size":
-                files.sort(key=lambda x: x['size'], reverse=True)
-
-            
+            # Only a reference to the file is kept in the session; pages are read on demand
             if 'previewed_file' not in st.session_state:
                 st.session_state.previewed_file = None
-            if 'file_content_to_preview' not in st.session_state:
-                st.session_state.file_content_to_preview = None
 
             # Display the table with clickable file names
-        for i, file in enumerate(files):
+        for file in page_files:
             file_name = file['name']
             file_title = clean_title(os.path.splitext(file_name)[0])
             # Each file name is a button that updates the session state for preview
-            if st.button(file_title, key=f"preview_{i}"):
-                st.session_state['previewed_file'] = file_name
-                st.session_state['file_content_to_preview'] = read_file_content(file['path'])
-        
+            if st.button(file_title, key=f"preview_{file['path']}"):
+                st.session_state['previewed_file'] = file['path']
+                st.session_state['preview_page'] = 1
+        if page_count > 1:
+            st.session_state['preview_list_page'] = page_number
+            page_selector(page_count, 'preview_list_page')
+
          # Show the preview if a file name has been clicked
-        if st.session_state['previewed_file']:
-            st.markdown(f"## Preview of {st.session_state['previewed_file']}")
-            components.html(st.session_state['file_content_to_preview'] , height=800, scrolling=True)
+        previewed_file = st.session_state['previewed_file']
+        if previewed_file and os.path.exists(previewed_file):
+            preview, preview_page, preview_page_count, preview_title = get_preview_page(
+                previewed_file, st.session_state.get('preview_page', 1), PREVIEW_PARAGRAPHS_PER_PAGE,
+            )
+            st.markdown(f"## Preview of {preview_title}")
+            components.html(preview, height=800, scrolling=True)
+            if preview_page_count > 1:
+                st.session_state['preview_page'] = preview_page
+                page_selector(preview_page_count, 'preview_page')
         
         
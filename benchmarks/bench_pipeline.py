@@ -0,0 +1,222 @@
+"""
+Benchmark every stage of the audio/video pipeline on synthetic media.
+
+Generates speech-like audio (tone bursts separated by pauses) with NumPy, encodes it
+with ffmpeg as MP3 or as MP4 with a test-pattern video track, and runs it through
+hashing, audio preconditioning, splitting, transcription, GPT formatting and HTML
+conversion. API calls go to benchmarks/mock_openai_server.py with a configurable
+latency and error rate, so runs are repeatable and free.
+
+Each input runs in a fresh Python process. One JSON line is printed per stage with
+the wall time, the CPU time of the process and its ffmpeg children and the peak RSS
+during the stage, so results can be diffed between commits on the same machine.
+
+Usage: python benchmarks/bench_pipeline.py [--minutes 5 30] [--kind audio video]
+           [--latency 0.2] [--error-rate 0.05] [--part-mb 4] [--workdir DIR]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.abspath(os.path.dirname(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_RATE = 16000
+RSS_SAMPLE_INTERVAL = 0.02
+
+
+def synthetic_speech(seconds, seed=0):
+    """Tone bursts of 1-6 s with 0.3-1.5 s pauses, shaped like speech for the silence detector."""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    samples = np.zeros(total, dtype=np.float32)
+    position = 0
+    while position < total:
+        burst = int(rng.uniform(1, 6) * SAMPLE_RATE)
+        end = min(total, position + burst)
+        t = np.arange(end - position, dtype=np.float32) / SAMPLE_RATE
+        pitch = rng.uniform(120, 260)
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)  # syllable-rate modulation
+        samples[position:end] = 0.3 * envelope * np.sin(2 * np.pi * pitch * t)
+        samples[position:end] += 0.02 * rng.standard_normal(end - position).astype(np.float32)
+        position = end + int(rng.uniform(0.3, 1.5) * SAMPLE_RATE)
+    return (np.clip(samples, -1, 1) * 32767).astype(np.int16)
+
+
+def generate_media(path, minutes, kind):
+    seconds = minutes * 60
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+    ]
+    if kind == "video":
+        command += [
+            "-f", "lavfi", "-i", f"testsrc=size=640x360:rate=15:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-b:a", "128k", "-shortest",
+        ]
+    else:
+        command += ["-ac", "2", "-ar", "44100", "-c:a", "libmp3lame", "-b:a", "192k"]
+    process = subprocess.Popen(command + [path], stdin=subprocess.PIPE)
+    # Write a minute at a time so long inputs never sit in memory whole
+    for minute in range(minutes):
+        process.stdin.write(synthetic_speech(60, seed=minute).tobytes())
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to generate {path}")
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageMeter:
+    """Measures wall time, CPU time and peak RSS of one stage."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.result = {"stage": stage}
+        self._stop = threading.Event()
+        self._peak_rss = 0.0
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._peak_rss = max(self._peak_rss, current_rss_mb())
+            time.sleep(RSS_SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self._peak_rss = current_rss_mb()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._stop.set()
+        self._sampler.join()
+        self.result.update({
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(cpu, 3),
+            "child_cpu_seconds": round(children.ru_utime + children.ru_stime - self._children.ru_utime - self._children.ru_stime, 3),
+            "peak_rss_mb": round(self._peak_rss, 1),
+            # ru_maxrss of children is the largest single child so far, in kilobytes on Linux
+            "child_peak_rss_mb": round(children.ru_maxrss / 1024, 1),
+        })
+        if exc is not None:
+            self.result["error"] = f"{exc_type.__name__}: {exc}"
+        print(json.dumps(self.result), flush=True)
+        return True  # Report the failure and carry on with the remaining stages
+
+
+def run_child(path, args):
+    from mock_openai_server import start_mock_server
+    server = start_mock_server(latency=args.latency, error_rate=args.error_rate, token_delay=args.token_delay)
+    # Configuration is read at import time, so point the client at the mock server first
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    sys.path.insert(0, REPO_ROOT)
+    # Caches and checkpoints land in the working directory; start from an empty one
+    os.chdir(os.path.dirname(path))
+    for cache_file in ("whisper_cache.db", "whisper_cache.db-wal", "whisper_cache.db-shm"):
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+
+    from file_hash_helpers import calculate_file_hash_from_path
+    from audio_video_helpers import precondition_audio, split_large_avfile
+    from api_helpers import transcribe_parts_concurrently, reformat_transcript_with_gpt4
+    from html_creator_helper import convert_txt_to_html
+    from http_client_helpers import get_api_client
+    from transcription_backends import OpenAIWhisperBackend
+    from config_const import PRECONDITION_BITRATE_KBPS
+
+    audio_path, parts, transcript, formatted = None, [], "", None
+    with StageMeter("hash"):
+        calculate_file_hash_from_path(path)
+    with StageMeter("precondition"):
+        audio_path = precondition_audio(path)
+    with StageMeter("split") as meter:
+        # A small part limit makes short inputs split the way long ones do in production
+        parts = split_large_avfile(audio_path, max_size=int(args.part_mb * 1024 * 1024),
+                                   bitrate_kbps=PRECONDITION_BITRATE_KBPS, copy_codec=True)
+        meter.result["parts"] = len(parts)
+    with StageMeter("transcribe") as meter:
+        transcriptions = transcribe_parts_concurrently(parts, OpenAIWhisperBackend("mock-key"))
+        transcript = "\n".join(text or "" for text in transcriptions)
+        meter.result["failed_parts"] = sum(1 for text in transcriptions if not text)
+    with StageMeter("format") as meter:
+        formatted = reformat_transcript_with_gpt4(transcript, "mock-key")
+        meter.result["characters"] = len(formatted or "")
+    text_path = os.path.splitext(path)[0] + "_bench.txt"
+    with open(text_path, "w", encoding="utf-8") as text_file:
+        text_file.write(formatted or transcript)
+    with StageMeter("html"):
+        convert_txt_to_html(text_path, os.path.splitext(path)[0] + "_bench.html", os.path.basename(path), None)
+
+    print(json.dumps({"stage": "summary", "api": get_api_client().metrics(), "mock_server": server.counters}, default=str), flush=True)
+    server.shutdown()
+    for part in parts:
+        if part != audio_path and os.path.exists(part):
+            os.remove(part)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, nargs="+", default=[5, 30])
+    parser.add_argument("--kind", choices=["audio", "video"], nargs="+", default=["audio", "video"])
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean mock API latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock API requests that fail")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--part-mb", type=float, default=4.0, help="Maximum part size passed to the splitter")
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, BENCHMARK_DIR)
+        run_child(args.child, args)
+        return
+
+    if shutil.which("ffmpeg") is None:
+        sys.exit("ffmpeg is required to generate and process the synthetic media")
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench_pipeline_"))
+    os.makedirs(workdir, exist_ok=True)
+    passthrough = ["--latency", str(args.latency), "--error-rate", str(args.error_rate),
+                   "--token-delay", str(args.token_delay), "--part-mb", str(args.part_mb)]
+    for kind in args.kind:
+        for minutes in args.minutes:
+            path = os.path.join(workdir, f"synthetic_{kind}_{minutes}min.{'mp4' if kind == 'video' else 'mp3'}")
+            if not os.path.exists(path):
+                generate_media(path, minutes, kind)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", path, *passthrough],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            for line in output.splitlines():
+                if not line.startswith("{"):
+                    continue
+                result = json.loads(line)
+                result.update({"kind": kind, "input_minutes": minutes, "input_mb": round(os.path.getsize(path) / (1024 * 1024), 1)})
+                print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark peak memory of split_large_avfile against input duration.
+
+Generates synthetic stereo MP3 files of increasing length with ffmpeg, splits each
+one in a fresh Python process and prints one JSON line per duration with the wall
+time, the part count, the speed of the silence analysis and the peak RSS of both the Python process and its ffmpeg
+children.
+
+Usage: python benchmarks/bench_splitter.py [--minutes 15 30 60 120] [--workdir DIR]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def generate_audio(path, minutes):
+    # 320 kbps stereo so even short inputs exceed the 25 MB limit and get split
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={minutes * 60}",
+        "-ac", "2", "-c:a", "libmp3lame", "-b:a", "320k", path,
+    ]
+    subprocess.run(command, check=True)
+
+
+def run_child(path):
+    sys.path.insert(0, REPO_ROOT)
+    from audio_boundary_helpers import compute_rms_energy
+    from audio_video_helpers import split_large_avfile
+
+    start = time.perf_counter()
+    _, duration = compute_rms_energy(path)
+    analysis_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parts = split_large_avfile(path)
+    elapsed = time.perf_counter() - start
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    for part in parts:
+        if part != path:
+            os.remove(part)
+    # ru_maxrss is reported in kilobytes on Linux
+    print(json.dumps({
+        "wall_seconds": round(elapsed, 3),
+        "parts": len(parts),
+        "analysis_seconds": round(analysis_elapsed, 3),
+        "analysis_realtime_factor": round(duration / analysis_elapsed, 1) if analysis_elapsed else None,
+        "python_peak_rss_mb": round(own.ru_maxrss / 1024, 1),
+        "ffmpeg_peak_rss_mb": round(children.ru_maxrss / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, nargs="+", default=[15, 30, 60, 120])
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_splitter_")
+    for minutes in args.minutes:
+        path = os.path.join(workdir, f"synthetic_{minutes}min.mp3")
+        if not os.path.exists(path):
+            generate_audio(path, minutes)
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", path],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        result.update({"input_minutes": minutes, "input_mb": round(os.path.getsize(path) / (1024 * 1024), 1)})
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
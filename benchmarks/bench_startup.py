@@ -0,0 +1,113 @@
+"""
+Benchmark app start-up: module import time and first-paint latency.
+
+Each measurement runs in a fresh Python process, so nothing is already cached in
+sys.modules. Prints one JSON line per measurement:
+
+- import: wall time of importing streamlit, then of importing baker on top of it,
+  plus the slowest modules baker pulls in (from python -X importtime).
+- first_paint: time for streamlit's AppTest to run main.py once in a new process
+  (cold: imports, cached resources and the first render) and then again (warm:
+  what every later rerun and new session costs), on both pages.
+
+Usage: python benchmarks/bench_startup.py [--repeat 3] [--top 10] [--workdir DIR]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_imports(workdir):
+    code = (
+        "import time, json, sys\n"
+        f"sys.path.insert(0, {REPO_ROOT!r})\n"
+        "start = time.perf_counter(); import streamlit, streamlit.components.v1; middle = time.perf_counter()\n"
+        "import baker; end = time.perf_counter()\n"
+        "print(json.dumps({'streamlit_seconds': middle - start, 'baker_seconds': end - middle}))\n"
+    )
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=workdir, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def top_modules(importtime_output, top):
+    # python -X importtime prints a module's imports before the module itself, indented
+    # one level deeper; keep the modules imported directly by baker
+    lines = [line.split("|") for line in importtime_output.splitlines() if line.startswith("import time:") and line.count("|") == 2]
+    end = next((i for i, (_, _, name) in enumerate(lines) if name.rstrip() == " baker"), None)
+    if end is None:
+        return []
+    start = end
+    while start > 0 and lines[start - 1][2].startswith("  "):
+        start -= 1
+    children = []
+    for _, cumulative, name in lines[start:end]:
+        if name.startswith("   ") and not name.startswith("     "):
+            children.append((int(cumulative.strip()), name.strip()))
+    return [{"module": name, "ms": round(micros / 1000, 1)} for micros, name in sorted(children, reverse=True)[:top]]
+
+
+def measure_first_paint(workdir):
+    code = (
+        "import time, json, sys, os\n"
+        f"sys.path.insert(0, {REPO_ROOT!r})\n"
+        "from streamlit.testing.v1 import AppTest\n"
+        "results = {}\n"
+        f"app = AppTest.from_file({os.path.join(REPO_ROOT, 'main.py')!r}, default_timeout=120)\n"
+        "app.secrets['openai_api_key'] = 'benchmark-key'\n"
+        "start = time.perf_counter(); app.run(); results['cold_seconds'] = time.perf_counter() - start\n"
+        "start = time.perf_counter(); app.run(); results['warm_seconds'] = time.perf_counter() - start\n"
+        "app.sidebar.radio[0].set_value('File Preview')\n"
+        "start = time.perf_counter(); app.run(); results['file_preview_seconds'] = time.perf_counter() - start\n"
+        "results['exceptions'] = [str(e.value) for e in app.exception]\n"
+        "print(json.dumps(results))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest modules to list")
+    parser.add_argument("--workdir", default=None, help="Working directory for the app's data files")
+    args = parser.parse_args()
+
+    # The app creates its folders and databases in the working directory
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench_startup_"))
+    os.makedirs(workdir, exist_ok=True)
+
+    import_runs = []
+    importtime_output = ""
+    for _ in range(args.repeat):
+        timings, importtime_output = measure_imports(workdir)
+        import_runs.append(timings)
+    print(json.dumps({
+        "measurement": "import",
+        "streamlit_ms": round(statistics.median(run["streamlit_seconds"] for run in import_runs) * 1000, 1),
+        "baker_ms": round(statistics.median(run["baker_seconds"] for run in import_runs) * 1000, 1),
+        "slowest_modules": top_modules(importtime_output, args.top),
+    }))
+
+    paint_runs = [measure_first_paint(workdir) for _ in range(args.repeat)]
+    failures = [run for run in paint_runs if "error" in run]
+    if failures:
+        print(json.dumps({"measurement": "first_paint", "error": failures[0]["error"]}))
+        return
+    print(json.dumps({
+        "measurement": "first_paint",
+        **{f"{name.replace('_seconds', '')}_ms": round(statistics.median(run[name] for run in paint_runs) * 1000, 1)
+           for name in ("cold_seconds", "warm_seconds", "file_preview_seconds")},
+        "exceptions": paint_runs[-1]["exceptions"],
+    }))
+
+
+if __name__ == "__main__":
+    main()
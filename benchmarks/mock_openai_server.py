@@ -0,0 +1,143 @@
+"""
+Local stand-in for the OpenAI endpoints the pipeline calls.
+
+Serves POST /v1/audio/transcriptions and POST /v1/chat/completions (plain and
+streamed) with a configurable latency and error rate, so API-bound stages can be
+benchmarked without network noise or cost. Failed requests answer 429 with a
+Retry-After header or 500, which exercises the client's retry path.
+
+Usage: python benchmarks/mock_openai_server.py [--port 8765] [--latency 0.2] [--error-rate 0.05]
+Then run the app or a benchmark with OPENAI_API_BASE=http://127.0.0.1:8765/v1.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS_PER_TRANSCRIPTION = 400
+STREAM_CHUNK_WORDS = 4
+FILLER_WORDS = "so the idea here is that we take the signal and we look at how it changes over time".split()
+
+
+def filler_text(word_count, seed=0):
+    words = [FILLER_WORDS[(seed + i) % len(FILLER_WORDS)] for i in range(word_count)]
+    sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+    return " ".join(sentences)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _maybe_fail(self):
+        config = self.server.config
+        time.sleep(max(0.0, random.gauss(config["latency"], config["latency"] * config["jitter"])))
+        if random.random() >= config["error_rate"]:
+            return False
+        if random.random() < 0.5:
+            self._send_json(429, {"error": {"message": "Rate limit reached"}}, {"Retry-After": "0.1"})
+        else:
+            self._send_json(500, {"error": {"message": "Internal server error"}})
+        self.server.count("errors")
+        return True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count("requests")
+        if self._maybe_fail():
+            return
+        if self.path.endswith("/audio/transcriptions"):
+            self._send_json(200, {"text": filler_text(WORDS_PER_TRANSCRIPTION, seed=len(body))})
+        elif self.path.endswith("/chat/completions"):
+            self._chat_completion(json.loads(body))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _chat_completion(self, request):
+        # Echo the user's text back, as a formatting pass would return roughly the same words
+        prompt = request["messages"][-1]["content"]
+        prompt_tokens = sum(len(message["content"].split()) for message in request["messages"])
+        if not request.get("stream"):
+            self._send_json(200, {
+                "choices": [{"message": {"role": "assistant", "content": prompt}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(prompt.split())},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = prompt.split(" ")
+        token_delay = self.server.config["token_delay"]
+        for i in range(0, len(words), STREAM_CHUNK_WORDS):
+            content = " ".join(words[i:i + STREAM_CHUNK_WORDS]) + " "
+            self._write_chunk(f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n")
+            if token_delay:
+                time.sleep(token_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.2, jitter=0.25, error_rate=0.0, token_delay=0.0):
+        super().__init__(("127.0.0.1", port), MockOpenAIHandler)
+        self.config = {"latency": latency, "jitter": jitter, "error_rate": error_rate, "token_delay": token_delay}
+        self.counters = {"requests": 0, "errors": 0}
+        self._counters_lock = threading.Lock()
+
+    def count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+# Start a mock server on a background thread; call shutdown() when done
+def start_mock_server(**config):
+    server = MockOpenAIServer(**config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Latency standard deviation as a fraction of the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429 or 500")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed chunks")
+    args = parser.parse_args()
+    server = MockOpenAIServer(args.port, args.latency, args.jitter, args.error_rate, args.token_delay)
+    print(f"Mock OpenAI API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
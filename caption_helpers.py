@@ -0,0 +1,134 @@
+import html
+import logging
+import re
+from collections import deque, namedtuple
+from config_const import CAPTION_MAX_OVERLAP_WORDS, CAPTION_MIN_OVERLAP_WORDS, CAPTION_PARAGRAPH_GAP_SECONDS, CAPTION_PARAGRAPH_MAX_CHARS
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+Cue = namedtuple('Cue', ['start', 'end', 'text'])
+
+# hh:mm:ss.mmm, mm:ss.mmm and the SRT forms with a comma before the milliseconds
+TIMESTAMP = r'(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})'
+TIMING_PATTERN = re.compile(TIMESTAMP + r'\s*-->\s*' + TIMESTAMP)
+# Voice spans, class spans and the inline word timestamps of rolling captions
+CUE_TAG_PATTERN = re.compile(r'<[^>]*>')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SENTENCE_END_CHARACTERS = ('.', '?', '!', '…')
+
+def _timestamp_seconds(hours, minutes, seconds, fraction):
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction.ljust(3, '0')) / 1000
+
+def _block_to_cue(block):
+    for index, line in enumerate(block):
+        timing = TIMING_PATTERN.search(line)
+        if timing:
+            groups = timing.groups()
+            text = " ".join(CUE_TAG_PATTERN.sub("", text_line) for text_line in block[index + 1:])
+            # Keep markup characters as entities: the text is written into HTML paragraphs as it is
+            text = WHITESPACE_PATTERN.sub(" ", html.escape(html.unescape(text), quote=False)).strip()
+            if not text:
+                return None
+            return Cue(_timestamp_seconds(*groups[:4]), _timestamp_seconds(*groups[4:]), text)
+    # Header, NOTE, STYLE and REGION blocks have no timing line
+    return None
+
+# Parse VTT or SRT cues from an iterable of lines
+def iter_cues(lines):
+    """
+    Yields the cues of a WebVTT or SRT caption file one at a time.
+
+    Only the lines of the current cue are held in memory, so a file iterator can be
+    passed in for caption files of any size.
+
+    :param lines: Iterable of lines, for example an open file.
+    :return: Generator of Cue(start, end, text) with times in seconds and markup removed.
+    """
+    block = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        # Only an empty line ends a cue; rolling captions put a line of spaces inside one
+        if line:
+            block.append(line)
+            continue
+        if block:
+            cue = _block_to_cue(block)
+            if cue:
+                yield cue
+            block = []
+    if block:
+        cue = _block_to_cue(block)
+        if cue:
+            yield cue
+
+# Drop the words each rolling caption repeats from the captions before it
+def merge_rolling_cues(cues, max_overlap_words=CAPTION_MAX_OVERLAP_WORDS, min_overlap_words=CAPTION_MIN_OVERLAP_WORDS):
+    """
+    Auto-generated captions repeat the previous line before adding new words.
+    Each cue is trimmed to the words that follow the longest overlap with the end of
+    the text emitted so far. Short overlaps are ordinary speech ("the store" / "store
+    hours"), so only an overlap of at least min_overlap_words, or one covering the
+    whole previous cue, is trimmed. A cue whose words were all emitted already is
+    skipped. The overlap search is bounded by max_overlap_words, so the whole
+    pass is linear in the number of cues.
+
+    :param cues: Iterable of Cue.
+    :param max_overlap_words: Longest repeated run of words looked for.
+    :param min_overlap_words: Shortest overlap treated as repetition, unless it covers
+        the whole previous cue.
+    :return: Generator of Cue with repeated text removed.
+    """
+    recent_words = deque(maxlen=max_overlap_words)
+    previous_words = []
+    for cue in cues:
+        words = cue.text.split(" ")
+        recent = list(recent_words)
+        overlap = 0
+        for length in range(min(len(words), len(recent)), 0, -1):
+            if recent[-length:] == words[:length]:
+                overlap = length
+                break
+        covers_previous_cue = previous_words and words[:len(previous_words)] == previous_words
+        if overlap < min_overlap_words and not covers_previous_cue:
+            overlap = 0
+        previous_words = words
+        if overlap == len(words):
+            continue
+        new_words = words[overlap:]
+        recent_words.extend(new_words)
+        yield Cue(cue.start, cue.end, " ".join(new_words))
+
+# Group cue text into paragraphs at pauses and sentence ends
+def iter_caption_paragraphs(cues, gap_seconds=CAPTION_PARAGRAPH_GAP_SECONDS, max_chars=CAPTION_PARAGRAPH_MAX_CHARS):
+    paragraph = []
+    length = 0
+    last_end = None
+    for cue in cues:
+        pause = last_end is not None and cue.start - last_end >= gap_seconds
+        long_sentence_done = length >= max_chars and paragraph and paragraph[-1].endswith(SENTENCE_END_CHARACTERS)
+        if paragraph and (pause or long_sentence_done):
+            yield " ".join(paragraph)
+            paragraph, length = [], 0
+        paragraph.append(cue.text)
+        length += len(cue.text) + 1
+        last_end = cue.end
+    if paragraph:
+        yield " ".join(paragraph)
+
+# Stream a caption file into plain text, one paragraph per line
+def caption_file_to_text(caption_file_path, output_text_file_path):
+    """
+    :param caption_file_path: Path to a .vtt or .srt file.
+    :param output_text_file_path: Path of the text file to write.
+    :return: Number of paragraphs written.
+    """
+    count = 0
+    # utf-8-sig drops the byte order mark some exports start with
+    with open(caption_file_path, 'r', encoding='utf-8-sig', errors='replace') as caption_file, \
+            open(output_text_file_path, 'w', encoding='utf-8') as output_file:
+        for paragraph in iter_caption_paragraphs(merge_rolling_cues(iter_cues(caption_file))):
+            output_file.write(paragraph + "\n")
+            count += 1
+    logging.info(f"Extracted {count} paragraphs from {caption_file_path}")
+    return count
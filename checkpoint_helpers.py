@@ -0,0 +1,84 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from config_const import CHECKPOINT_DIRECTORY
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_manifest_lock = threading.Lock()
+
+def _manifest_path(job_key):
+    digest = hashlib.sha256(job_key.encode('utf-8')).hexdigest()[:32]
+    return os.path.join(CHECKPOINT_DIRECTORY, f"{digest}.json")
+
+def _source_signature(source_path):
+    if source_path is None or not os.path.exists(source_path):
+        return None
+    stat = os.stat(source_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+# Load the checkpoint manifest of a pipeline run
+def load_manifest(job_key, source_path=None):
+    """
+    Loads the checkpoint manifest for a pipeline run, or starts a new one.
+
+    :param job_key: Identifies the run, e.g. the uploaded file path or "youtube:<url>".
+    :param source_path: Optional input file; if it changed since the manifest was
+        written, all checkpoints are discarded.
+    :return: Manifest dictionary to pass to get_checkpoint and set_checkpoint.
+    """
+    path = _manifest_path(job_key)
+    signature = _source_signature(source_path)
+    manifest = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable checkpoint manifest {path}: {e}")
+    if manifest is None or manifest.get('source_signature') != signature:
+        manifest = {'job_key': job_key, 'source_signature': signature, 'stages': {}}
+    manifest['path'] = path
+    return manifest
+
+# Write the manifest atomically so a crash never leaves it half written
+def save_manifest(manifest):
+    os.makedirs(CHECKPOINT_DIRECTORY, exist_ok=True)
+    with _manifest_lock:
+        temp_path = f"{manifest['path']}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(manifest, file)
+        os.replace(temp_path, manifest['path'])
+
+# Return a stage's checkpointed value if its output files still exist
+def get_checkpoint(manifest, stage, params=None):
+    """
+    :param manifest: Manifest from load_manifest.
+    :param stage: Stage name, e.g. "audio", "parts", "transcript:<part path>", "html".
+    :param params: Optional settings the stage depends on; a checkpoint written with
+        different settings is treated as missing.
+    :return: The stored value, or None if the stage has to run again.
+    """
+    entry = manifest['stages'].get(stage)
+    if entry is None or entry.get('params') != params:
+        return None
+    if not all(os.path.exists(path) for path in entry.get('files', [])):
+        return None
+    logging.info(f"Resuming from checkpoint: {stage}")
+    return entry['value']
+
+# Record that a stage finished
+def set_checkpoint(manifest, stage, value, files=(), params=None):
+    """
+    :param manifest: Manifest from load_manifest.
+    :param stage: Stage name.
+    :param value: JSON-serializable result of the stage.
+    :param files: Output files that must still exist for the checkpoint to be valid.
+    :param params: Optional settings the stage depends on.
+    """
+    manifest['stages'][stage] = {'value': value, 'files': list(files), 'params': params, 'finished_at': time.time()}
+    save_manifest(manifest)
@@ -1,4 +1,119 @@
+import os
+
 # Define directories for uploads and processed files
 UPLOAD_DIRECTORY = "uploaded_files"
 PROCESSED_DIRECTORY = "processed_files"
-TRANSCRIPT_DIRECTORY= "pr"
\ No newline at end of file
+TRANSCRIPT_DIRECTORY= "pr"
+
+# Whisper transcription settings
+WHISPER_MODEL = "whisper-1"
+WHISPER_MAX_FILE_SIZE = 24.5 * 1024 * 1024  # stay below the API's 25 MB upload limit
+WHISPER_MAX_CONCURRENCY = 4  # maximum number of parts in flight at once
+WHISPER_PART_RETRIES = 3  # extra attempts for a single failed part
+WHISPER_RETRY_BACKOFF = 2  # base delay in seconds between part retries
+
+# Bitrate used when splitting large files into parts
+SPLIT_AUDIO_BITRATE_KBPS = 128
+SPLIT_TARGET_PART_SECONDS = 600  # preferred part length; parts are cut at the nearest pause
+
+# Persistent cache of Whisper results keyed by part audio hash and model
+WHISPER_CACHE_DB_PATH = "whisper_cache.db"
+WHISPER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Block size used when hashing and saving uploads
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# Indexed store of uploaded file hashes used for duplicate detection
+HASH_DB_PATH = "file_hashes.db"
+LEGACY_HASH_CSV_PATH = "file_hashes.csv"  # imported once into HASH_DB_PATH
+
+# Number of media probe results kept in memory
+PROBE_CACHE_SIZE = 512
+
+# Speech-optimized audio produced before transcription; at 32 kbps an hour of audio is about 14 MB
+PRECONDITION_CODEC = "mp3"  # "mp3" or "opus"
+PRECONDITION_BITRATE_KBPS = 32
+PRECONDITION_SAMPLE_RATE = 16000
+
+# GPT reformatting settings; a window's output is about as long as its input,
+# so windows are sized to keep the completion under the model's output limit
+GPT_MODEL = "gpt-4-1106-preview"
+REFORMAT_WINDOW_TOKENS = 3500  # prompt tokens per window, instructions included
+REFORMAT_MAX_CONCURRENCY = 4
+
+# Pre-flight estimate assumptions and prices in USD
+SPEECH_TOKENS_PER_MINUTE = 200  # about 150 spoken words per minute
+WHISPER_PRICE_PER_MINUTE = 0.006
+GPT_PROMPT_PRICE_PER_1K = 0.01
+GPT_COMPLETION_PRICE_PER_1K = 0.03
+
+# Shared HTTP client for the OpenAI API; point OPENAI_API_BASE at a local stub server for testing
+OPENAI_API_BASE = os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1")
+HTTP_POOL_SIZE = 16
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_BASE = 1  # seconds
+HTTP_BACKOFF_MAX = 60  # seconds
+HTTP_CONNECT_TIMEOUT = 10  # seconds
+HTTP_READ_TIMEOUT = 600  # seconds; long uploads and completions take minutes
+
+# Background job queue shared by all sessions of a server process
+JOB_DB_PATH = "jobs.db"
+JOB_WORKER_COUNT = 8  # files in flight at the same time; PIPELINE_STAGE_LIMITS caps each stage
+JOB_POLL_INTERVAL = 2  # seconds between checks for new jobs from other processes
+JOB_STATUS_REFRESH_SECONDS = 2
+
+# Per-stage checkpoint manifests used to resume interrupted pipeline runs
+CHECKPOINT_DIRECTORY = "checkpoints"
+
+# Stream GPT formatting output to disk and the job panel as it is generated
+STREAM_FORMATTING = True
+
+# Local CPU transcription backend (faster-whisper, CTranslate2)
+DEFAULT_TRANSCRIPTION_BACKEND = "openai"
+LOCAL_WHISPER_MODEL = "small"
+LOCAL_WHISPER_COMPUTE_TYPE = "int8"
+LOCAL_WHISPER_WORKERS = 2  # parts transcribed in parallel by one model instance
+LOCAL_WHISPER_CPU_THREADS = 4  # threads per worker
+LOCAL_WHISPER_BATCH_SIZE = 8
+
+# File management listings
+FILE_INDEX_MAX_AGE = 60  # seconds before an unchanged directory is rescanned anyway
+FILE_PAGE_SIZE = 25
+
+# Full-text search over published transcripts (SQLite FTS5)
+SEARCH_INDEX_DB_PATH = "search_index.db"
+SEARCH_RESULT_LIMIT = 50
+SEARCH_SNIPPET_TOKENS = 16
+
+# Transcript preview pages
+PREVIEW_PARAGRAPHS_PER_PAGE = 40
+PREVIEW_INDEX_CACHE_SIZE = 256  # transcripts whose paragraph offsets are kept in memory
+PREVIEW_PAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # rendered pages shared by all sessions
+PREVIEW_READ_BLOCK_SIZE = 256 * 1024
+
+# Re-rendering transcript pages for a new stylesheet
+RERENDER_MAX_WORKERS = os.cpu_count() or 1
+RERENDER_CHUNK_SIZE = 16
+
+# Caption (VTT/SRT) import
+CAPTION_MAX_OVERLAP_WORDS = 40  # longest run of words a rolling caption repeats
+CAPTION_MIN_OVERLAP_WORDS = 3  # shorter overlaps are ordinary speech, not repetition
+CAPTION_PARAGRAPH_GAP_SECONDS = 2.0  # a pause this long starts a new paragraph
+CAPTION_PARAGRAPH_MAX_CHARS = 800  # start a new paragraph at the next sentence end after this
+
+# Concurrency limit of each pipeline stage across all job workers. Media work runs
+# ffmpeg and is bound by CPU cores; the other stages mostly wait on the network.
+PIPELINE_STAGE_LIMITS = {
+    'download': 2,
+    'media': max(1, (os.cpu_count() or 2) // 2),
+    'transcribe': 3,
+    'format': 3,
+    'render': 2,
+}
+
+# YouTube ingestion downloads only an audio stream; 48 kbps is plenty for speech
+YOUTUBE_MIN_AUDIO_KBPS = 48
+YOUTUBE_RANGE_SIZE = 9 * 1024 * 1024  # bytes per Range request; unranged downloads get throttled
+
+# Credit ledger shared by all server processes
+CREDIT_DB_PATH = "credits.db"
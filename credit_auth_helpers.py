@@ -1,7 +1,14 @@
 # Description: This file contains the helper functions for the credit authentication service.
+import logging
+import time
+from config_const import CREDIT_DB_PATH
+from sqlite_helpers import ensure_schema
 
-# Example backend storage for credits (in-memory, for demonstration purposes)
-credits_db = {
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Accounts created in the ledger the first time it is opened; balances then live in CREDIT_DB_PATH
+INITIAL_CREDIT_ACCOUNTS = {
     'john_doeasu': {'key': 'johns_keyasu', 'credits': 100}, 
     'yash_asu': {'key': 'yash_keyasu', 'credits': 200},
     'ad_asu': {'key': 'ad_keyasu', 'credits': 200},
@@ -9,15 +16,163 @@ credits_db = {
     'lw_asu': {'key': 'lw_keyasu', 'credits': 200},
 }
 
+# Reservation states
+RESERVED = 'reserved'
+COMMITTED = 'committed'
+RELEASED = 'released'
+
+CREDIT_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS credit_accounts (
+        name TEXT PRIMARY KEY,
+        key TEXT NOT NULL,
+        balance REAL NOT NULL,
+        reserved REAL NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS credit_reservations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        amount REAL NOT NULL,
+        state TEXT NOT NULL,
+        reference TEXT,
+        created_at REAL NOT NULL,
+        settled_at REAL
+    )""",
+    # Every change to a balance or hold, in order; rows are never updated or deleted
+    """CREATE TABLE IF NOT EXISTS credit_ledger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        balance_change REAL NOT NULL,
+        reserved_change REAL NOT NULL,
+        balance_after REAL NOT NULL,
+        reservation_id INTEGER,
+        reference TEXT,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS credit_ledger_name ON credit_ledger (name, id)",
+    """CREATE TRIGGER IF NOT EXISTS credit_ledger_no_update BEFORE UPDATE ON credit_ledger
+       BEGIN SELECT RAISE(ABORT, 'credit_ledger is append-only'); END""",
+    """CREATE TRIGGER IF NOT EXISTS credit_ledger_no_delete BEFORE DELETE ON credit_ledger
+       BEGIN SELECT RAISE(ABORT, 'credit_ledger is append-only'); END""",
+]
+
+def _get_credit_connection():
+    connection = ensure_schema(CREDIT_DB_PATH, CREDIT_SCHEMA)
+    if not getattr(_get_credit_connection, 'seeded', False):
+        seed_credit_accounts(connection, INITIAL_CREDIT_ACCOUNTS)
+        _get_credit_connection.seeded = True
+    return connection
+
+def _append_ledger(connection, name, kind, balance_change, reserved_change, balance_after, reservation_id=None, reference=None):
+    connection.execute(
+        """INSERT INTO credit_ledger (name, kind, balance_change, reserved_change, balance_after, reservation_id, reference, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (name, kind, balance_change, reserved_change, balance_after, reservation_id, reference, time.time()),
+    )
+
+# Create accounts that do not exist yet; existing balances are left alone
+def seed_credit_accounts(connection, accounts):
+    now = time.time()
+    with connection:
+        for name, account in accounts.items():
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO credit_accounts (name, key, balance, reserved, updated_at) VALUES (?, ?, ?, 0, ?)",
+                (name, account['key'], account['credits'], now),
+            )
+            if cursor.rowcount:
+                _append_ledger(connection, name, 'seed', account['credits'], 0, account['credits'])
+
+# Look up an account by name and key
+def get_credit_account(name, key):
+    """
+    :return: Dictionary with 'balance', 'reserved' and 'available' credits, or None if
+        the name and key do not match an account.
+    """
+    row = _get_credit_connection().execute(
+        "SELECT balance, reserved FROM credit_accounts WHERE name = ? AND key = ?", (name, key),
+    ).fetchone()
+    if row is None:
+        return None
+    return {'balance': row['balance'], 'reserved': row['reserved'], 'available': row['balance'] - row['reserved']}
+
+# Hold credits for a job before it starts
+def reserve_credits(name, key, amount, reference=None):
+    """
+    Atomically holds amount credits if the account has that much available. Held
+    credits cannot be reserved by other jobs or sessions, in this or any other process.
+
+    :param name: Account name.
+    :param key: Account key.
+    :param amount: Estimated credits the job will use.
+    :param reference: Free-form note stored with the reservation, such as the file name.
+    :return: Tuple of (reservation id or None, message).
+    """
+    now = time.time()
+    connection = _get_credit_connection()
+    with connection:
+        # The condition and the update run as one statement, so concurrent reservations cannot overdraw
+        row = connection.execute(
+            """UPDATE credit_accounts SET reserved = reserved + ?, updated_at = ?
+               WHERE name = ? AND key = ? AND balance - reserved >= ?
+               RETURNING balance""",
+            (amount, now, name, key, amount),
+        ).fetchone()
+        if row is None:
+            if get_credit_account(name, key) is None:
+                return None, "Invalid name or key."
+            return None, "Not enough credits."
+        reservation_id = connection.execute(
+            "INSERT INTO credit_reservations (name, amount, state, reference, created_at) VALUES (?, ?, ?, ?, ?)",
+            (name, amount, RESERVED, reference, now),
+        ).lastrowid
+        _append_ledger(connection, name, 'reserve', 0, amount, row['balance'], reservation_id, reference)
+    return reservation_id, "Credits reserved successfully."
+
+def _settle_reservation(reservation_id, state, actual_amount):
+    now = time.time()
+    connection = _get_credit_connection()
+    with connection:
+        reservation = connection.execute(
+            "UPDATE credit_reservations SET state = ?, settled_at = ? WHERE id = ? AND state = ? RETURNING name, amount, reference",
+            (state, now, reservation_id, RESERVED),
+        ).fetchone()
+        if reservation is None:
+            logging.warning(f"Credit reservation {reservation_id} is unknown or already settled")
+            return False
+        if actual_amount is None:
+            actual_amount = reservation['amount']
+        elif actual_amount > reservation['amount']:
+            # Only the held credits are guaranteed to be available, so never charge more
+            logging.warning(f"Credit reservation {reservation_id} used {actual_amount} credits but held {reservation['amount']}; charging the held amount")
+            actual_amount = reservation['amount']
+        row = connection.execute(
+            """UPDATE credit_accounts SET balance = balance - ?, reserved = reserved - ?, updated_at = ?
+               WHERE name = ? RETURNING balance""",
+            (actual_amount, reservation['amount'], now, reservation['name']),
+        ).fetchone()
+        kind = 'commit' if state == COMMITTED else 'release'
+        _append_ledger(connection, reservation['name'], kind, -actual_amount, -reservation['amount'], row['balance'], reservation_id, reservation['reference'])
+    return True
+
+# Charge the credits a finished job actually used and return the rest of its hold
+def commit_credits(reservation_id, actual_amount=None):
+    """
+    :param reservation_id: Id returned by reserve_credits.
+    :param actual_amount: Credits the job really used; may be less than the reserved amount.
+        Defaults to the reserved amount, and is capped at it.
+    :return: True if the reservation was settled, False if it was unknown or already settled.
+    """
+    return _settle_reservation(reservation_id, COMMITTED, actual_amount)
+
+# Return the whole hold of a job that failed or was cancelled
+def release_credits(reservation_id):
+    return _settle_reservation(reservation_id, RELEASED, 0)
+
 def check_and_deduct_credits(name, key, duration):
-    # Check if the name is in the credits database
-    if name in credits_db and credits_db[name]['key'] == key:
-        # Check if the user has enough credits
-        if credits_db[name]['credits'] >= duration:
-            # Deduct the credits
-            credits_db[name]['credits'] -= duration
-            return True, "Credits deducted successfully."
-        else:
-            return False, "Not enough credits."
-    else:
-        return False, "Invalid name or key."   
\ No newline at end of file
+    # Reserve and charge in one go for callers that know the exact amount up front
+    reservation_id, message = reserve_credits(name, key, duration)
+    if reservation_id is None:
+        return False, message
+    commit_credits(reservation_id, duration)
+    return True, "Credits deducted successfully."
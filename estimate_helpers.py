@@ -0,0 +1,96 @@
+import logging
+import math
+import os
+from api_helpers import get_encoding, num_tokens_from_messages, build_reformat_messages
+from media_probe_helpers import probe_media
+from config_const import (
+    GPT_MODEL, REFORMAT_WINDOW_TOKENS, SPEECH_TOKENS_PER_MINUTE,
+    WHISPER_PRICE_PER_MINUTE, GPT_PROMPT_PRICE_PER_1K, GPT_COMPLETION_PRICE_PER_1K,
+)
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+AUDIO_VIDEO_EXTENSIONS = ['.mp3', '.mp4', '.wav', '.avi', '.mov', '.flac']
+
+# Estimate minutes, tokens and cost for a batch before anything is submitted
+def estimate_batch(entries, model=GPT_MODEL):
+    """
+    Estimates audio minutes, prompt tokens, completion tokens and cost for a batch of jobs.
+
+    All transcript texts are encoded together with tiktoken's batch encoder. Audio
+    entries are always reformatted after transcription, so their transcript length
+    is estimated from their duration.
+
+    :param entries: List of dictionaries with a 'name' and either 'audio_seconds'
+        (audio or video) or 'text' (transcript), plus an optional 'format_with_gpt' flag.
+    :param model: The chat model used for reformatting.
+    :return: Dictionary with an 'items' list of per-entry estimates and a 'totals' dictionary.
+    """
+    encoding = get_encoding(model)
+    prompt_overhead = num_tokens_from_messages(build_reformat_messages(""), model)
+    window_budget = max(1, REFORMAT_WINDOW_TOKENS - prompt_overhead)
+
+    text_entries = [entry for entry in entries if entry.get('text') is not None]
+    text_token_counts = [len(tokens) for tokens in encoding.encode_batch([entry['text'] for entry in text_entries])]
+    token_counts = {id(entry): count for entry, count in zip(text_entries, text_token_counts)}
+
+    items = []
+    for entry in entries:
+        audio_minutes = (entry.get('audio_seconds') or 0) / 60
+        if id(entry) in token_counts:
+            transcript_tokens = token_counts[id(entry)]
+            format_with_gpt = entry.get('format_with_gpt', False)
+        else:
+            transcript_tokens = int(audio_minutes * SPEECH_TOKENS_PER_MINUTE)
+            format_with_gpt = True
+
+        prompt_tokens = completion_tokens = 0
+        if format_with_gpt and transcript_tokens:
+            # Every window repeats the instructions; the output is about as long as the input
+            windows = math.ceil(transcript_tokens / window_budget)
+            prompt_tokens = transcript_tokens + windows * prompt_overhead
+            completion_tokens = transcript_tokens
+
+        cost = (
+            audio_minutes * WHISPER_PRICE_PER_MINUTE
+            + prompt_tokens / 1000 * GPT_PROMPT_PRICE_PER_1K
+            + completion_tokens / 1000 * GPT_COMPLETION_PRICE_PER_1K
+        )
+        items.append({
+            'name': entry['name'],
+            'audio_minutes': round(audio_minutes, 2),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'estimated_cost': round(cost, 4),
+        })
+
+    totals = {
+        field: round(sum(item[field] for item in items), 4)
+        for field in ['audio_minutes', 'prompt_tokens', 'completion_tokens', 'estimated_cost']
+    }
+    return {'items': items, 'totals': totals}
+
+# Build estimate entries from Streamlit uploads without writing them to disk
+def estimate_uploads(uploaded_files, format_with_gpt):
+    """
+    Estimates the cost of processing a batch of uploads.
+
+    :param uploaded_files: List of Streamlit UploadedFile objects.
+    :param format_with_gpt: Whether text uploads will be reformatted with GPT.
+    :return: Same structure as estimate_batch.
+    """
+    entries = []
+    for uploaded_file in uploaded_files:
+        extension = os.path.splitext(uploaded_file.name)[1].lower()
+        if extension in AUDIO_VIDEO_EXTENSIONS:
+            try:
+                audio_seconds = probe_media(uploaded_file)['duration'] or 0
+            except (ValueError, OSError):
+                logging.warning(f"Could not probe {uploaded_file.name} for the estimate")
+                audio_seconds = 0
+            entries.append({'name': uploaded_file.name, 'audio_seconds': audio_seconds})
+        else:
+            text = bytes(uploaded_file.getbuffer()).decode('utf-8', errors='replace')
+            entries.append({'name': uploaded_file.name, 'text': text, 'format_with_gpt': format_with_gpt})
+    return estimate_batch(entries)
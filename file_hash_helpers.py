@@ -1,6 +1,14 @@
 import hashlib
 import csv
+import logging
 import os
+import tempfile
+import time
+from config_const import UPLOAD_BLOCK_SIZE, HASH_DB_PATH, LEGACY_HASH_CSV_PATH
+from sqlite_helpers import ensure_schema
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 #Calculate file hash
 def calculate_file_hash(file_data):
@@ -8,27 +16,146 @@ def calculate_file_hash(file_data):
     hasher.update(file_data)
     return hasher.hexdigest()
 
-# Write file hash to CSV
-def write_hash_to_csv(file_hash, filename):
-    with open('file_hashes.csv', 'a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([file_hash, filename])
-
-# Read file hashes from CSV
-def read_hashes_from_csv():
-    if not os.path.exists('file_hashes.csv'):
-        return set()
-    with open('file_hashes.csv', 'r', newline='') as file:
-        reader = csv.reader(file)
-        return {row[0] for row in reader if len(row) > 0}
-    
-# Delete file hash from CSV
-def delete_hash_from_csv():
-    """
-    Clears all the file hash from file_hashes.csv.
-    """
-    # Read all rows except the one with the matching hash
-    # Rewrite file_hashes.csv without the deleted file's hash
-    with open('file_hashes.csv', 'w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["hash", "filename"])  # Writing only the headers
\ No newline at end of file
+# Calculate file hash from a path without loading the whole file
+def calculate_file_hash_from_path(file_path, block_size=1024*1024):
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+# Save an upload to a temporary file, hashing it in the same pass
+def save_upload_to_temp_file(uploaded_file, directory, block_size=UPLOAD_BLOCK_SIZE):
+    """
+    Writes an uploaded file to a temporary file in the given directory while updating its SHA-256.
+
+    Blocks are sliced from the upload's getbuffer() memoryview, so no copy of the
+    whole file is made and memory use is bounded by the block size.
+
+    :param uploaded_file: Streamlit UploadedFile or any binary file-like object.
+    :param directory: Directory for the temporary file; use the final directory so it can be renamed atomically.
+    :param block_size: Number of bytes hashed and written per block.
+    :return: Tuple of (temporary file path, hex digest).
+    """
+    hasher = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload_', suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            if hasattr(uploaded_file, 'getbuffer'):
+                buffer = uploaded_file.getbuffer()
+                try:
+                    for offset in range(0, len(buffer), block_size):
+                        block = buffer[offset:offset + block_size]
+                        hasher.update(block)
+                        temp_file.write(block)
+                        block.release()
+                finally:
+                    buffer.release()
+            else:
+                for block in iter(lambda: uploaded_file.read(block_size), b''):
+                    hasher.update(block)
+                    temp_file.write(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, hasher.hexdigest()
+
+HASH_STORE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS file_hashes (
+        hash TEXT PRIMARY KEY,
+        user TEXT,
+        filename TEXT NOT NULL,
+        file_path TEXT,
+        size INTEGER,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS file_hashes_file_path ON file_hashes (file_path)",
+    "CREATE TABLE IF NOT EXISTS file_hashes_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+]
+
+def _get_hash_connection():
+    connection = ensure_schema(HASH_DB_PATH, HASH_STORE_SCHEMA)
+    import_hashes_from_csv(connection)
+    return connection
+
+# One-time import of the hashes recorded in the legacy file_hashes.csv
+def import_hashes_from_csv(connection, csv_path=LEGACY_HASH_CSV_PATH):
+    """
+    Imports hashes from the legacy CSV store the first time the SQLite store is opened.
+
+    :param connection: Connection to the hash store.
+    :param csv_path: Path to the legacy CSV file.
+    :return: Number of imported hashes.
+    """
+    if connection.execute("SELECT 1 FROM file_hashes_meta WHERE name = 'csv_imported'").fetchone():
+        return 0
+    imported = 0
+    now = time.time()
+    with connection:
+        # Re-check inside the write transaction in case another process imported first
+        if connection.execute("SELECT 1 FROM file_hashes_meta WHERE name = 'csv_imported'").fetchone():
+            return 0
+        if os.path.exists(csv_path):
+            with open(csv_path, 'r', newline='') as file:
+                for row in csv.reader(file):
+                    if len(row) < 2 or row[0] == 'hash':
+                        continue
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO file_hashes (hash, filename, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                        (row[0], row[1], now, now),
+                    )
+                    imported += cursor.rowcount
+        connection.execute("INSERT INTO file_hashes_meta (name, value) VALUES ('csv_imported', ?)", (str(now),))
+    if imported:
+        logging.info(f"Imported {imported} hashes from {csv_path}")
+    return imported
+
+# Record a file hash unless it is already known
+def claim_file_hash(file_hash, filename, user=None, file_path=None, size=None):
+    """
+    Atomically records a file hash. Two sessions uploading the same file at the same
+    time cannot both claim it, so this doubles as the duplicate check.
+
+    :param file_hash: SHA-256 hex digest of the file.
+    :param filename: Name of the uploaded file.
+    :param user: User folder the file belongs to.
+    :param file_path: Path the file is saved at.
+    :param size: File size in bytes.
+    :return: True if the hash was recorded, False if it was already present.
+    """
+    now = time.time()
+    connection = _get_hash_connection()
+    with connection:
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO file_hashes (hash, user, filename, file_path, size, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_hash, user, filename, file_path, size, now, now),
+        )
+    return cursor.rowcount == 1
+
+# Look up the stored entry for a file hash
+def get_file_hash_entry(file_hash):
+    connection = _get_hash_connection()
+    row = connection.execute("SELECT * FROM file_hashes WHERE hash = ?", (file_hash,)).fetchone()
+    return dict(row) if row else None
+
+# Delete the hash of a single file
+def delete_hash_for_path(file_path):
+    """
+    Removes the hash entry of the file saved at file_path, so it can be uploaded again.
+
+    Hashes imported from the legacy CSV only recorded the file name, so when no entry
+    has this path, a legacy entry with the same file name is removed instead.
+
+    :param file_path: Path of the deleted file.
+    :return: Number of removed entries.
+    """
+    connection = _get_hash_connection()
+    with connection:
+        cursor = connection.execute("DELETE FROM file_hashes WHERE file_path = ?", (file_path,))
+        if cursor.rowcount == 0:
+            cursor = connection.execute(
+                "DELETE FROM file_hashes WHERE file_path IS NULL AND filename = ?",
+                (os.path.basename(file_path),),
+            )
+    return cursor.rowcount
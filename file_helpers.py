@@ -1,4 +1,3 @@
-from moviepy.editor import AudioFileClip, VideoFileClip
 import logging
 import os
 import csv
@@ -102,4 +101,15 @@ def read_file_content(file_path):
             return file.read()
     except Exception as e:
         logging.error(f"Error reading file: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Read the end of a text file without loading all of it
+def read_file_tail(file_path, max_bytes=4000):
+    try:
+        with open(file_path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            file.seek(max(0, file.tell() - max_bytes))
+            return file.read().decode('utf-8', errors='replace')
+    except OSError as e:
+        logging.error(f"Error reading file: {e}")
+        return None
@@ -0,0 +1,98 @@
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from config_const import FILE_INDEX_MAX_AGE
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Directory path -> (mtime_ns, files, subdirectories, scanned_at)
+_directory_cache = {}
+_directory_cache_lock = threading.Lock()
+
+def _scan_directory(directory):
+    files, subdirectories = [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files.append({
+                        'name': entry.name,
+                        'path': entry.path,
+                        'size': stat.st_size,
+                        'mtime': datetime.fromtimestamp(stat.st_mtime),
+                    })
+            except OSError:
+                continue  # If the file was deleted while scanning, skip it
+    return files, subdirectories
+
+def _indexed_directory(directory, now):
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        with _directory_cache_lock:
+            _directory_cache.pop(directory, None)
+        return [], []
+    with _directory_cache_lock:
+        cached = _directory_cache.get(directory)
+    # Adding, removing or renaming an entry changes the directory's mtime; the age limit
+    # picks up files that were rewritten in place
+    if cached and cached[0] == mtime_ns and now - cached[3] < FILE_INDEX_MAX_AGE:
+        return cached[1], cached[2]
+    files, subdirectories = _scan_directory(directory)
+    with _directory_cache_lock:
+        _directory_cache[directory] = (mtime_ns, files, subdirectories, now)
+    return files, subdirectories
+
+# List every file under a directory, rescanning only directories that changed
+def get_file_index(directory):
+    """
+    Returns the files under a directory tree with their size and modification time.
+
+    Each directory's listing is cached with its mtime, so an unchanged library costs one
+    stat per directory instead of a stat per file.
+
+    :param directory: Root directory to index.
+    :return: List of dictionaries with 'name', 'path', 'size' and 'mtime'.
+    """
+    now = time.monotonic()
+    index = []
+    pending = [directory]
+    while pending:
+        files, subdirectories = _indexed_directory(pending.pop(), now)
+        index.extend(files)
+        pending.extend(subdirectories)
+    return index
+
+# Search and sort an index the way the file pages present it
+def filter_and_sort_files(files, search_query=None, sort_option="Name"):
+    if search_query:
+        files = [file for file in files if search_query.lower() in file['name'].lower()]
+    else:
+        files = list(files)
+    if sort_option == "Name":
+        files.sort(key=lambda x: x['name'].lower())
+    elif sort_option == "Date Modified":
+        files.sort(key=lambda x: x['mtime'], reverse=True)
+    elif sort_option == "Size":
+        files.sort(key=lambda x: x['size'], reverse=True)
+    return files
+
+# Slice a list into pages
+def paginate(items, page_number, page_size):
+    """
+    :param items: Full list of items.
+    :param page_number: 1-based page number; clamped to the valid range.
+    :param page_size: Number of items per page.
+    :return: Tuple of (items on the page, clamped page number, page count).
+    """
+    page_count = max(1, math.ceil(len(items) / page_size))
+    page_number = min(max(1, page_number), page_count)
+    start = (page_number - 1) * page_size
+    return items[start:start + page_size], page_number, page_count
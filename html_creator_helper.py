@@ -2,7 +2,8 @@ import os
 import re
 import html
 import logging
-from werkzeug.utils import secure_filename
+from concurrent.futures import ProcessPoolExecutor
+from config_const import RERENDER_MAX_WORKERS, RERENDER_CHUNK_SIZE
 
 # Set up basic configuration for logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -30,65 +31,135 @@ def clean_title(file_name):
 
 
 
-# convert txt to html 
-def convert_txt_to_html(txt_file_path, html_file_path, title, css_file_path):
-    try:
-        title = clean_title(title)
-        print(title)
-        # Read the content of the .txt file
-        with open(txt_file_path, 'r') as file:
-            transcription = file.read()
-
-        # Split into paragraphs and wrap in <p> tags
-        paragraphs = transcription.split('\n')
-        paragraphs = [f'<p>{p.strip()}</p>' for p in paragraphs if p.strip() != '']
-        
-        main_header_frame = f'''
+# Page template; paragraphs are streamed between the header and the footer
+HTML_PAGE_HEADER = """
+        <!DOCTYPE html>
+        <html lang="en">
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1">
-            <link rel="stylesheet" type="text/css" href={css_file_path}>
+            <meta name="transcript-source" content="{source}">
+            <link rel="stylesheet" type="text/css" href="{css_file_path}">
             <title>{title}</title>
-        </head>'''
-        
-        main_body_frame = f'''
+        </head>
         <body>
         <main>
         <header>
         <h1>{title}</h1>
         </header>
         <div>
-        {''.join(paragraphs)}
-        </div>
-        </main>'''
-        
+        """
 
-        # HTML footer content
-        footer = '''
+HTML_PAGE_FOOTER = """
+        </div>
+        </main>
         <footer>
         <hr>
             <img src="https://assets.ea.asu.edu/ulc/images/asu_header%20logo%20small%20200%20px.png" alt="ASU logo">
             <br>
             <p>This page was created by Universal Learner Courses. Visit <a href="https://ea.asu.edu/">ASU Universal Learner courses</a> to learn more.</p>
-        </footer>'''
-        
-        
-
-        # Construct the HTML content
-        html_content = f'''
-        <!DOCTYPE html>
-        <html lang="en">
-        {main_header_frame}
-        {main_body_frame}
-        {footer}
+        </footer>
         </body>
-        </html>'''
-        
-        # Write the HTML content to a file
-        with open(html_file_path, "w") as html_file:
-            html_file.write(html_content)
+        </html>"""
+
+TRANSCRIPT_SOURCE_PATTERN = re.compile(r'<meta name="transcript-source" content="([^"]*)">')
+
+# Write a transcript page from an iterable of paragraphs without holding the transcript in memory
+def render_transcript_html(paragraphs, html_file_path, title, css_file_path, source=""):
+    """
+    Streams paragraphs into the page template. The page is written to a temporary file
+    and moved into place, so readers never see a half-written page.
+
+    :param paragraphs: Iterable of paragraph strings; blank ones are skipped.
+    :param html_file_path: Path of the page to write.
+    :param title: Title shown in the page; already cleaned.
+    :param css_file_path: Stylesheet URL or path linked from the page.
+    :param source: Path of the text the page was rendered from, recorded for re-rendering.
+    """
+    temp_path = html_file_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as html_file:
+        html_file.write(HTML_PAGE_HEADER.format(
+            source=html.escape(source or "", quote=True),
+            css_file_path=html.escape(css_file_path or "", quote=True),
+            title=title,
+        ))
+        for paragraph in paragraphs:
+            paragraph = paragraph.strip()
+            if paragraph:
+                html_file.write(f'<p>{paragraph}</p>')
+        html_file.write(HTML_PAGE_FOOTER)
+    os.replace(temp_path, html_file_path)
+
+# convert txt to html 
+def convert_txt_to_html(txt_file_path, html_file_path, title, css_file_path):
+    try:
+        title = clean_title(title)
+        print(title)
+        # Read the .txt file line by line; each line is a paragraph
+        with open(txt_file_path, 'r', encoding='utf-8') as file:
+            render_transcript_html(file, html_file_path, title, css_file_path, source=txt_file_path)
 
         logging.info(f"HTML file created: {html_file_path}")
 
     except Exception as e:
-        logging.error(f"Error converting TXT to HTML: {e}")
\ No newline at end of file
+        logging.error(f"Error converting TXT to HTML: {e}")
+
+# Paragraphs of an existing page, for pages whose text source is gone
+def iter_html_paragraphs(html_file_path):
+    from preview_helpers import get_preview_index
+    index = get_preview_index(html_file_path)
+    with open(html_file_path, 'rb') as file:
+        for start, end in index.ranges:
+            file.seek(start)
+            yield file.read(end - start).decode('utf-8', errors='replace')
+
+# Re-render one page with a new stylesheet; runs in a worker process
+def rerender_html_file(html_file_path, css_file_path):
+    """
+    :param html_file_path: Path of an existing transcript page.
+    :param css_file_path: Stylesheet for the new page.
+    :return: Tuple of (html_file_path, error message or None).
+    """
+    try:
+        with open(html_file_path, 'r', encoding='utf-8') as html_file:
+            page_start = html_file.read(4096)
+        source_match = TRANSCRIPT_SOURCE_PATTERN.search(page_start)
+        source = html.unescape(source_match.group(1)) if source_match else ""
+        title_match = re.search(r'<h1>(.*?)</h1>', page_start, re.DOTALL)
+        title = title_match.group(1).strip() if title_match else clean_title(os.path.splitext(html_file_path)[0])
+        if source and os.path.exists(source):
+            with open(source, 'r', encoding='utf-8') as source_file:
+                render_transcript_html(source_file, html_file_path, title, css_file_path, source=source)
+        else:
+            # Pages from before the source was recorded are re-rendered from their own paragraphs
+            paragraphs = list(iter_html_paragraphs(html_file_path))
+            render_transcript_html(paragraphs, html_file_path, title, css_file_path, source=source)
+        return html_file_path, None
+    except Exception as e:
+        return html_file_path, str(e)
+
+# Re-theme every transcript page in a folder across a process pool
+def rerender_html_directory(directory, css_file_path, max_workers=RERENDER_MAX_WORKERS, chunksize=RERENDER_CHUNK_SIZE):
+    """
+    Regenerates every .html page in a folder with a new stylesheet from its text
+    source. No transcription or formatting is repeated.
+
+    :param directory: Folder with the transcript pages, usually processed/{name}_{key}/html.
+    :param css_file_path: Stylesheet for the new pages.
+    :param max_workers: Number of worker processes.
+    :param chunksize: Pages handed to a worker at a time.
+    :return: Tuple of (number of pages re-rendered, list of (path, error) for failures).
+    """
+    if not os.path.isdir(directory):
+        return 0, []
+    html_file_paths = [entry.path for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith('.html')]
+    if not html_file_paths:
+        return 0, []
+    failures = []
+    with ProcessPoolExecutor(max_workers=max(1, min(max_workers, len(html_file_paths)))) as executor:
+        for html_file_path, error in executor.map(rerender_html_file, html_file_paths, [css_file_path] * len(html_file_paths), chunksize=chunksize):
+            if error:
+                logging.error(f"Error re-rendering {html_file_path}: {error}")
+                failures.append((html_file_path, error))
+    logging.info(f"Re-rendered {len(html_file_paths) - len(failures)} pages in {directory}")
+    return len(html_file_paths) - len(failures), failures
@@ -0,0 +1,173 @@
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+import requests
+from requests.adapters import HTTPAdapter
+from config_const import (
+    OPENAI_API_BASE, HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+)
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RATE_LIMIT_RESET_HEADERS = ['x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens']
+DURATION_PART_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+# Parse a Retry-After header given either in seconds or as an HTTP date
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+# Parse a rate-limit reset header such as "20ms", "1s" or "6m0s"
+def parse_reset_duration(value):
+    if not value:
+        return None
+    parts = DURATION_PART_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+def _close_files(files):
+    for value in (files or {}).values():
+        handle = value[1] if isinstance(value, tuple) and len(value) > 1 else value
+        if hasattr(handle, 'close'):
+            handle.close()
+
+class ApiClient:
+    """
+    Shared HTTP client for the OpenAI API.
+
+    Keeps TCP and TLS connections alive in a pool, retries rate-limited and failed
+    requests with jittered exponential backoff (or the delay the server asks for in
+    Retry-After or rate-limit reset headers), applies per-request timeouts and records
+    latency and retry metrics. One instance is safe to share between threads.
+    """
+
+    def __init__(self, base_url=OPENAI_API_BASE, pool_size=HTTP_POOL_SIZE, max_retries=HTTP_MAX_RETRIES,
+                 backoff_base=HTTP_BACKOFF_BASE, backoff_max=HTTP_BACKOFF_MAX,
+                 timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._metrics_lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._counters = {'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'rate_limited': 0}
+
+    def _retry_delay(self, attempt, response=None):
+        if response is not None:
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delays = [parse_reset_duration(response.headers.get(header)) for header in RATE_LIMIT_RESET_HEADERS]
+                delays = [delay for delay in delays if delay is not None]
+                delay = max(delays) if delays else None
+            if delay is not None:
+                return min(delay, self.backoff_max) + random.uniform(0, self.backoff_base)
+        # Full jitter keeps many workers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _count(self, counter, amount=1):
+        with self._metrics_lock:
+            self._counters[counter] += amount
+
+    def post(self, path, headers=None, json=None, data=None, files=None, timeout=None, stream=False):
+        """
+        Sends a POST request, retrying transient failures.
+
+        :param path: Path relative to the base URL, e.g. "/chat/completions".
+        :param headers: Request headers.
+        :param json: JSON body.
+        :param data: Form or raw body.
+        :param files: Callable returning a requests files dictionary. It is called once per
+            attempt so file handles can be reopened for a retry; they are closed afterwards.
+        :param timeout: (connect, read) timeout in seconds; defaults to the client's timeout.
+        :param stream: Do not read the response body up front.
+        :return: The successful requests.Response.
+        :raises requests.RequestException: When the request still fails after all retries.
+        """
+        url = f"{self.base_url}{path}"
+        self._count('requests')
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            self._count('attempts')
+            request_files = files() if callable(files) else files
+            response = None
+            try:
+                response = self.session.post(
+                    url, headers=headers, json=json, data=data, files=request_files,
+                    timeout=timeout or self.timeout, stream=stream,
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    with self._metrics_lock:
+                        self._latencies.append(time.perf_counter() - start)
+                    return response
+                if response.status_code == 429:
+                    self._count('rate_limited')
+                error = requests.HTTPError(f"{response.status_code} Error for url: {url}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException:
+                self._count('failures')
+                raise
+            finally:
+                if callable(files):
+                    _close_files(request_files)
+
+            if attempt >= self.max_retries:
+                self._count('failures')
+                raise error
+            delay = self._retry_delay(attempt, response)
+            if response is not None:
+                response.close()
+            logging.warning(f"Retrying {url} in {delay:.1f}s after: {error}")
+            self._count('retries')
+            time.sleep(delay)
+            attempt += 1
+
+    def metrics(self):
+        """
+        :return: Dictionary with request, attempt, retry, failure and rate-limit counters and
+            latency percentiles (in seconds, retries included) over the most recent requests.
+        """
+        with self._metrics_lock:
+            metrics = dict(self._counters)
+            latencies = sorted(self._latencies)
+        if latencies:
+            metrics.update({
+                'latency_p50': round(latencies[len(latencies) // 2], 3),
+                'latency_p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                'latency_max': round(latencies[-1], 3),
+            })
+        return metrics
+
+# Shared client for this process
+@lru_cache(maxsize=None)
+def get_api_client():
+    return ApiClient()
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from config_const import JOB_DB_PATH, JOB_WORKER_COUNT, JOB_POLL_INTERVAL
+from sqlite_helpers import ensure_schema
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JOB_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        title TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'queued',
+        stage TEXT NOT NULL DEFAULT 'queued',
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        worker TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)",
+    "CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user, id)",
+]
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+_job_handlers = {}
+_job_available = threading.Event()
+_workers_lock = threading.Lock()
+_workers = []
+
+def _get_job_connection():
+    return ensure_schema(JOB_DB_PATH, JOB_SCHEMA)
+
+def _worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# Register the function that runs jobs of a given kind
+def register_job_handler(kind, handler):
+    """
+    :param kind: Job kind, e.g. "audio_video".
+    :param handler: Callable(payload, report) returning a result string, or None on failure.
+        report(stage, done, total, message, output_path) records the job's progress. The
+        payload also holds the job's id under 'job_id'.
+    """
+    _job_handlers[kind] = handler
+
+# Add a job to the persistent queue
+def enqueue_job(user, kind, title, payload):
+    """
+    :param user: User folder the job belongs to.
+    :param kind: Job kind with a registered handler.
+    :param title: Short description shown in the job list.
+    :param payload: JSON-serializable dictionary passed to the handler.
+    :return: The new job id.
+    """
+    now = time.time()
+    connection = _get_job_connection()
+    with connection:
+        cursor = connection.execute(
+            "INSERT INTO jobs (user, kind, title, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (user, kind, title, json.dumps(payload), now, now),
+        )
+    _job_available.set()
+    logging.info(f"Queued job {cursor.lastrowid} ({kind}): {title}")
+    return cursor.lastrowid
+
+# Atomically claim the oldest queued job
+def claim_next_job():
+    now = time.time()
+    connection = _get_job_connection()
+    with connection:
+        row = connection.execute(
+            """UPDATE jobs SET state = ?, stage = 'starting', worker = ?, started_at = ?, updated_at = ?
+               WHERE id = (SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1) AND state = ?
+               RETURNING *""",
+            (RUNNING, _worker_id(), now, now, QUEUED, QUEUED),
+        ).fetchone()
+    return dict(row) if row else None
+
+# Record the current stage and progress of a job
+def update_job_progress(job_id, stage, progress=None, message=None, result=None):
+    """
+    :param result: Optional output path written while the job runs, e.g. the partial
+        formatted text during streaming; replaced by the final result when the job finishes.
+    """
+    connection = _get_job_connection()
+    with connection:
+        connection.execute(
+            "UPDATE jobs SET stage = ?, progress = COALESCE(?, progress), message = COALESCE(?, message), result = COALESCE(?, result), updated_at = ? WHERE id = ?",
+            (stage, progress, message, result, time.time(), job_id),
+        )
+
+# Mark a job as finished
+def finish_job(job_id, state, result=None, message=None):
+    now = time.time()
+    connection = _get_job_connection()
+    with connection:
+        connection.execute(
+            "UPDATE jobs SET state = ?, stage = ?, progress = CASE WHEN ? = ? THEN 1 ELSE progress END, result = ?, message = COALESCE(?, message), finished_at = ?, updated_at = ? WHERE id = ?",
+            (state, state, state, SUCCEEDED, result, message, now, now, job_id),
+        )
+
+# List a user's most recent jobs
+def list_jobs(user, limit=20):
+    connection = _get_job_connection()
+    rows = connection.execute("SELECT * FROM jobs WHERE user = ? ORDER BY id DESC LIMIT ?", (user, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+# Put jobs whose worker process on this host has died back in the queue
+def requeue_interrupted_jobs():
+    hostname = socket.gethostname()
+    connection = _get_job_connection()
+    requeued = 0
+    for row in connection.execute("SELECT id, worker FROM jobs WHERE state = ?", (RUNNING,)).fetchall():
+        worker_host, _, worker_pid = (row['worker'] or '').rpartition(':')
+        if worker_host != hostname or not worker_pid.isdigit() or _process_alive(int(worker_pid)):
+            continue
+        with connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, stage = ?, worker = NULL, message = 'Resumed after the worker stopped', updated_at = ? WHERE id = ? AND state = ?",
+                (QUEUED, QUEUED, time.time(), row['id'], RUNNING),
+            )
+        requeued += cursor.rowcount
+    if requeued:
+        logging.info(f"Requeued {requeued} interrupted jobs")
+    return requeued
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return False  # this process just started, so the job cannot be running here
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Run a claimed job through its handler
+def run_job(job):
+    job_id = job['id']
+    handler = _job_handlers.get(job['kind'])
+    if handler is None:
+        finish_job(job_id, FAILED, message=f"No handler registered for job kind: {job['kind']}")
+        return
+
+    def report(stage, done=None, total=None, message=None, output_path=None):
+        progress = done / total if done is not None and total else None
+        update_job_progress(job_id, stage, progress, message, output_path)
+
+    logging.info(f"Running job {job_id} ({job['kind']}): {job['title']}")
+    try:
+        payload = json.loads(job['payload'])
+        payload['job_id'] = job_id
+        result = handler(payload, report)
+    except Exception as e:
+        logging.exception(f"Job {job_id} failed")
+        finish_job(job_id, FAILED, message=str(e))
+        return
+    if result:
+        finish_job(job_id, SUCCEEDED, result=result, message="Finished")
+    else:
+        finish_job(job_id, FAILED, message="Processing failed")
+
+def _worker_loop():
+    while True:
+        try:
+            job = claim_next_job()
+        except Exception as e:
+            logging.error(f"Error claiming job: {e}")
+            job = None
+        if job is None:
+            _job_available.wait(JOB_POLL_INTERVAL)
+            _job_available.clear()
+            continue
+        # A database error while recording the outcome must not stop this worker
+        try:
+            run_job(job)
+        except Exception:
+            logging.exception(f"Error running job {job['id']}")
+
+# Start the process-wide worker pool
+def start_job_workers(worker_count=JOB_WORKER_COUNT):
+    """
+    Starts worker_count daemon threads that run queued jobs. Calling this again from
+    another session or rerun is a no-op, so the server keeps a fixed concurrency.
+
+    :param worker_count: Number of jobs run at the same time by this process.
+    :return: Number of running worker threads.
+    """
+    with _workers_lock:
+        if not _workers:
+            requeue_interrupted_jobs()
+            for index in range(worker_count):
+                worker = threading.Thread(target=_worker_loop, name=f"job-worker-{index + 1}", daemon=True)
+                worker.start()
+                _workers.append(worker)
+            logging.info(f"Started {worker_count} job workers")
+    return len(_workers)
@@ -1,5 +1,5 @@
 import streamlit as st
-from credit_auth_helpers import  credits_db
+from credit_auth_helpers import get_credit_account
 from baker import transcription_functionality, file_management
 
 # Update this line if openai_api_key is to be obtained from elsewhere
@@ -38,10 +38,13 @@ with st.sidebar:
         st.session_state.key = key
         credit_on = st.checkbox("Use credits", value=False, help="Use credits to process files.")
         
-        if st.session_state.name in credits_db and credits_db[st.session_state.name]['key'] == st.session_state.key:
+        credit_account = get_credit_account(st.session_state.name, st.session_state.key)
+        if credit_account is not None:
             st.success("User authenticated!")
             st.session_state['authenticated'] = True  # Mark user as authenticated
-            st.write(f"Available credits: {credits_db[st.session_state.name]['credits']}")
+            st.write(f"Available credits: {credit_account['available']:.0f}")
+            if credit_account['reserved']:
+                st.caption(f"{credit_account['reserved']:.0f} credits reserved by queued jobs")
         elif st.session_state.name or st.session_state.key:  # Only show an error if fields aren't empty
             st.error("Invalid name or key.")    
     st.title("Navigation")
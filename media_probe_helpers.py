@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from config_const import PROBE_CACHE_SIZE
+from file_hash_helpers import calculate_file_hash
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_probe_cache = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+def _cache_get(cache_key):
+    with _probe_cache_lock:
+        if cache_key in _probe_cache:
+            _probe_cache.move_to_end(cache_key)
+            return _probe_cache[cache_key]
+    return None
+
+def _cache_put(cache_key, metadata):
+    with _probe_cache_lock:
+        _probe_cache[cache_key] = metadata
+        _probe_cache.move_to_end(cache_key)
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+
+def _run_ffprobe(file_path):
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration,bit_rate,format_name,size:stream=codec_type,codec_name,channels,sample_rate,bit_rate",
+        "-of", "json", file_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    return result.returncode, result.stdout, result.stderr
+
+# Probe an in-memory upload through a seekable temporary copy
+def _run_ffprobe_on_buffer(buffer, name, block_size=1024*1024):
+    # ffprobe cannot seek a pipe: it reports no duration for MP3 and cannot reach an MP4 moov atom at the end
+    suffix = os.path.splitext(name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as temp_file:
+        for offset in range(0, len(buffer), block_size):
+            temp_file.write(buffer[offset:offset + block_size])
+        temp_file.flush()
+        return _run_ffprobe(temp_file.name)
+
+def _parse_probe_output(output, size):
+    probe = json.loads(output or '{}')
+    probe_format = probe.get('format', {})
+    streams = probe.get('streams', [])
+    audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), {})
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+
+    def number(value, cast=float):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        'size': size if size is not None else number(probe_format.get('size'), int),
+        'duration': number(probe_format.get('duration')),
+        'format': probe_format.get('format_name'),
+        'bit_rate': number(probe_format.get('bit_rate'), int),
+        'audio_codec': audio.get('codec_name'),
+        'audio_bit_rate': number(audio.get('bit_rate'), int),
+        'channels': number(audio.get('channels'), int),
+        'sample_rate': number(audio.get('sample_rate'), int),
+        'has_audio': bool(audio),
+        'has_video': video is not None,
+        'video_codec': video.get('codec_name') if video else None,
+    }
+
+# Probe duration, codec, bitrate, channels and sample rate with a single ffprobe call
+def probe_media(source, file_hash=None):
+    """
+    Reads media metadata from container headers with one ffprobe call, without decoding frames.
+
+    Results are memoized. Streamlit uploads are keyed by their file_id and size, other
+    in-memory buffers by their content hash; both are probed through a temporary copy,
+    because ffprobe needs to seek to find the duration of an MP3 or the moov atom at
+    the end of an MP4. For paths pass file_hash if it is already known, otherwise the
+    path, size and modification time stand in for it so the file is not read twice.
+
+    :param source: Path to a media file, or an in-memory upload (Streamlit UploadedFile,
+        BytesIO, bytes or memoryview).
+    :param file_hash: Optional SHA-256 of the content, if the caller already has it.
+    :return: Dictionary with size, duration, format, bit_rate, audio_codec, audio_bit_rate,
+        channels, sample_rate, has_audio, has_video and video_codec.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        cache_key = file_hash or ('path', os.path.realpath(source), stat.st_size, stat.st_mtime_ns)
+        metadata = _cache_get(cache_key)
+        if metadata is not None:
+            return metadata
+        return_code, output, error = _run_ffprobe(os.fspath(source))
+        size = stat.st_size
+        name = os.fspath(source)
+    else:
+        name = getattr(source, 'name', '<buffer>')
+        buffer = source.getbuffer() if hasattr(source, 'getbuffer') else memoryview(source)
+        try:
+            # A Streamlit upload keeps its file_id across reruns, so it needs no hashing
+            file_id = getattr(source, 'file_id', None)
+            cache_key = file_hash or (('upload', file_id, len(buffer)) if file_id else calculate_file_hash(buffer))
+            metadata = _cache_get(cache_key)
+            if metadata is not None:
+                return metadata
+            return_code, output, error = _run_ffprobe_on_buffer(buffer, name)
+            size = len(buffer)
+        finally:
+            if hasattr(source, 'getbuffer'):
+                buffer.release()
+
+    if return_code != 0:
+        logging.error(f"Error probing {name}: {error}")
+        raise ValueError(f"Unsupported or unreadable media file: {name}")
+
+    metadata = _parse_probe_output(output, size)
+    _cache_put(cache_key, metadata)
+    return metadata
@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from config_const import PIPELINE_STAGE_LIMITS
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class PipelineStage:
+    """
+    A concurrency limit for one stage of the file pipeline, shared by every job worker.
+
+    Job workers carry files through the stages one after another. Because each stage
+    has its own limit, a file waiting on the Whisper API holds only a transcription
+    slot, so the next file can use a media slot for ffmpeg at the same time. The
+    slowest stage then sets the batch throughput.
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._completed = 0
+        self._busy_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    def acquire(self, on_wait=None):
+        with self._condition:
+            if self._active >= self.limit and on_wait:
+                on_wait()
+            start = time.monotonic()
+            self._waiting += 1
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._waiting -= 1
+            self._active += 1
+            self._wait_seconds += time.monotonic() - start
+
+    def release(self, busy_seconds):
+        with self._condition:
+            self._active -= 1
+            self._completed += 1
+            self._busy_seconds += busy_seconds
+            self._condition.notify()
+
+    def metrics(self):
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'active': self._active,
+                'waiting': self._waiting,
+                'completed': self._completed,
+                'busy_seconds': round(self._busy_seconds, 1),
+                'wait_seconds': round(self._wait_seconds, 1),
+            }
+
+_stages = {name: PipelineStage(name, limit) for name, limit in PIPELINE_STAGE_LIMITS.items()}
+
+# Hold a slot of a pipeline stage for the duration of a block
+@contextmanager
+def pipeline_stage(name, progress_callback=None):
+    """
+    :param name: Stage name from PIPELINE_STAGE_LIMITS: "download", "media", "transcribe", "format" or "render".
+    :param progress_callback: Optional callable(stage, done, total, message), told when the
+        job has to wait for a free slot.
+    """
+    stage = _stages[name]
+    on_wait = None
+    if progress_callback:
+        on_wait = lambda: progress_callback("queued", None, None, f"Waiting for a free {name} slot")
+    stage.acquire(on_wait)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        stage.release(time.monotonic() - start)
+
+# Current load of every pipeline stage
+def pipeline_stage_metrics():
+    return {name: stage.metrics() for name, stage in _stages.items()}
@@ -0,0 +1,146 @@
+import html
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from config_const import PREVIEW_INDEX_CACHE_SIZE, PREVIEW_PAGE_CACHE_MAX_BYTES, PREVIEW_READ_BLOCK_SIZE
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+HTML_HEAD_PATTERN = re.compile(rb'<head>(.*?)</head>', re.DOTALL)
+HTML_TITLE_PATTERN = re.compile(rb'<h1>(.*?)</h1>', re.DOTALL)
+HTML_HEAD_SCAN_BYTES = 8192
+
+class PreviewIndex:
+    """Byte ranges of a transcript's paragraphs plus the page head, built in one streaming pass."""
+
+    def __init__(self, ranges, head, title, is_html):
+        self.ranges = ranges
+        self.head = head
+        self.title = title
+        self.is_html = is_html
+
+# Caches shared by every session in this process; both are keyed by path, mtime and size
+# so a rewritten file is never served from stale entries
+_index_cache = OrderedDict()
+_page_cache = OrderedDict()
+_page_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+def _file_signature(file_path):
+    stat = os.stat(file_path)
+    return (file_path, stat.st_mtime_ns, stat.st_size)
+
+# Byte ranges of the text between every start and end marker up to the stop marker, read block by block
+def _scan_marked_ranges(file, start_marker, end_marker, stop_marker, block_size=PREVIEW_READ_BLOCK_SIZE):
+    ranges = []
+    marker_length = max(len(start_marker), len(stop_marker))
+    buffer = b""
+    buffer_offset = 0  # file offset of buffer[0]
+    position = 0
+    while True:
+        start = buffer.find(start_marker, position)
+        stop = buffer.find(stop_marker, position)
+        if stop != -1 and (start == -1 or stop < start):
+            return ranges
+        end = buffer.find(end_marker, start + len(start_marker)) if start != -1 else -1
+        if start != -1 and end != -1:
+            ranges.append((buffer_offset + start + len(start_marker), buffer_offset + end))
+            position = end + len(end_marker)
+            continue
+        block = file.read(block_size)
+        if not block:
+            return ranges
+        # Keep only what could still contain the start of an unfinished paragraph
+        keep_from = start if start != -1 else max(position, len(buffer) - marker_length)
+        buffer_offset += keep_from
+        buffer = buffer[keep_from:] + block
+        position = 0
+
+# Byte ranges of the non-empty lines of a text file
+def _scan_line_ranges(file):
+    ranges = []
+    offset = 0
+    for line in file:
+        content = line.rstrip(b"\r\n")
+        if content.strip():
+            ranges.append((offset, offset + len(content)))
+        offset += len(line)
+    return ranges
+
+def _build_preview_index(file_path):
+    is_html = file_path.endswith('.html')
+    with open(file_path, 'rb') as file:
+        if not is_html:
+            return PreviewIndex(_scan_line_ranges(file), b"", os.path.basename(file_path), False)
+        start = file.read(HTML_HEAD_SCAN_BYTES)
+        head = HTML_HEAD_PATTERN.search(start)
+        title = HTML_TITLE_PATTERN.search(start)
+        file.seek(0)
+        ranges = _scan_marked_ranges(file, b"<p>", b"</p>", b"</main>")
+    return PreviewIndex(
+        ranges,
+        head.group(1) if head else b"",
+        title.group(1).decode('utf-8', errors='replace').strip() if title else os.path.basename(file_path),
+        True,
+    )
+
+# Paragraph index of a transcript, built once per version of the file
+def get_preview_index(file_path):
+    signature = _file_signature(file_path)
+    with _cache_lock:
+        if signature in _index_cache:
+            _index_cache.move_to_end(signature)
+            return _index_cache[signature]
+    index = _build_preview_index(file_path)
+    with _cache_lock:
+        _index_cache[signature] = index
+        while len(_index_cache) > PREVIEW_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+def _render_page(file_path, index, first, last):
+    paragraphs = []
+    with open(file_path, 'rb') as file:
+        for start, end in index.ranges[first:last]:
+            file.seek(start)
+            text = file.read(end - start).decode('utf-8', errors='replace')
+            # HTML transcripts are already escaped; plain text is escaped here
+            paragraphs.append(f"<p>{text if index.is_html else html.escape(text)}</p>")
+    head = index.head.decode('utf-8', errors='replace')
+    return f"<!DOCTYPE html><html><head>{head}</head><body><main><div>{''.join(paragraphs)}</div></main></body></html>"
+
+# One page of a transcript preview
+def get_preview_page(file_path, page_number, paragraphs_per_page):
+    """
+    Renders a range of a transcript's paragraphs as a standalone HTML page, reading
+    only those paragraphs from disk. Rendered pages are cached for every session up
+    to PREVIEW_PAGE_CACHE_MAX_BYTES.
+
+    :param file_path: Path to a published .html transcript or a .txt file.
+    :param page_number: 1-based page number; clamped to the valid range.
+    :param paragraphs_per_page: Number of paragraphs on each page.
+    :return: Tuple of (page HTML, clamped page number, page count, title).
+    """
+    global _page_cache_bytes
+    index = get_preview_index(file_path)
+    page_count = max(1, -(-len(index.ranges) // paragraphs_per_page))
+    page_number = min(max(1, page_number), page_count)
+    cache_key = (_file_signature(file_path), page_number, paragraphs_per_page)
+    with _cache_lock:
+        if cache_key in _page_cache:
+            _page_cache.move_to_end(cache_key)
+            return _page_cache[cache_key], page_number, page_count, index.title
+
+    first = (page_number - 1) * paragraphs_per_page
+    page = _render_page(file_path, index, first, first + paragraphs_per_page)
+    with _cache_lock:
+        if cache_key not in _page_cache:
+            _page_cache[cache_key] = page
+            _page_cache_bytes += len(page)
+        while _page_cache_bytes > PREVIEW_PAGE_CACHE_MAX_BYTES and len(_page_cache) > 1:
+            _, evicted = _page_cache.popitem(last=False)
+            _page_cache_bytes -= len(evicted)
+    return page, page_number, page_count, index.title
@@ -0,0 +1,160 @@
+import html
+import logging
+import os
+import re
+import sqlite3
+from config_const import SEARCH_INDEX_DB_PATH, SEARCH_RESULT_LIMIT, SEARCH_SNIPPET_TOKENS
+from sqlite_helpers import ensure_schema
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SEARCH_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS search_documents (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        user TEXT NOT NULL,
+        title TEXT NOT NULL,
+        mtime REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS search_documents_user ON search_documents (user)",
+    # rowid matches search_documents.id; stemming lets "lectures" find "lecture"
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, body, tokenize='porter unicode61')",
+]
+
+# Snippet markers that cannot appear in transcript text; swapped for <mark> after escaping
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"
+QUERY_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+HTML_PARAGRAPH_PATTERN = re.compile(r'<p>(.*?)</p>', re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+def _get_search_connection():
+    return ensure_schema(SEARCH_INDEX_DB_PATH, SEARCH_SCHEMA)
+
+# Add or replace a document in the search index
+def index_document(path, user, title, text):
+    """
+    Indexes the text of a transcript under the path users see in the file list.
+
+    :param path: Path of the published file, usually the transcript's .html file.
+    :param user: Owner of the file, as "{name}_{key}".
+    :param title: Title shown in search results.
+    :param text: Plain text of the transcript.
+    :return: True if the transcript was indexed. A failed index is logged and never
+        raised, so it cannot discard a finished transcript.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = 0.0
+    try:
+        connection = _get_search_connection()
+        with connection:
+            row = connection.execute("SELECT id FROM search_documents WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                connection.execute("DELETE FROM search_fts WHERE rowid = ?", (row['id'],))
+                connection.execute("UPDATE search_documents SET user = ?, title = ?, mtime = ? WHERE id = ?", (user, title, mtime, row['id']))
+                document_id = row['id']
+            else:
+                document_id = connection.execute(
+                    "INSERT INTO search_documents (path, user, title, mtime) VALUES (?, ?, ?, ?)",
+                    (path, user, title, mtime),
+                ).lastrowid
+            connection.execute("INSERT INTO search_fts (rowid, title, body) VALUES (?, ?, ?)", (document_id, title, text))
+    except sqlite3.Error as e:
+        logging.error(f"Could not index {path}: {e}")
+        return False
+    logging.info(f"Indexed transcript for search: {path}")
+    return True
+
+# Index a transcript from the text file it was rendered from
+def index_transcript_file(path, user, title, text_file_path):
+    try:
+        with open(text_file_path, 'r', encoding='utf-8') as text_file:
+            text = text_file.read()
+    except OSError as e:
+        logging.error(f"Could not index {path}: {e}")
+        return False
+    return index_document(path, user, title, text)
+
+# Remove a document from the search index
+def remove_document(path):
+    connection = _get_search_connection()
+    with connection:
+        row = connection.execute("SELECT id FROM search_documents WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            connection.execute("DELETE FROM search_fts WHERE rowid = ?", (row['id'],))
+            connection.execute("DELETE FROM search_documents WHERE id = ?", (row['id'],))
+
+# Plain text of a transcript page created by convert_txt_to_html
+def extract_text_from_html(html_content):
+    paragraphs = HTML_PARAGRAPH_PATTERN.findall(html_content)
+    return "\n".join(html.unescape(HTML_TAG_PATTERN.sub("", paragraph)) for paragraph in paragraphs)
+
+# Index published transcripts that are new or changed since they were last indexed
+def index_missing_documents(user, files):
+    """
+    Brings the index up to date for one user's published .html transcripts, so
+    transcripts created before the index existed become searchable.
+
+    :param user: Owner of the files, as "{name}_{key}".
+    :param files: File entries with 'path', 'name' and 'mtime' from get_file_index.
+    :return: Number of documents indexed.
+    """
+    connection = _get_search_connection()
+    indexed = {row['path']: row['mtime'] for row in connection.execute("SELECT path, mtime FROM search_documents WHERE user = ?", (user,))}
+    count = 0
+    for file in files:
+        if not file['path'].endswith('.html'):
+            continue
+        if indexed.get(file['path'], -1) >= file['mtime'].timestamp():
+            continue
+        try:
+            with open(file['path'], 'r', encoding='utf-8') as html_file:
+                text = extract_text_from_html(html_file.read())
+        except OSError as e:
+            logging.error(f"Could not index {file['path']}: {e}")
+            continue
+        if index_document(file['path'], user, os.path.splitext(file['name'])[0], text):
+            count += 1
+    return count
+
+# Turn what a user typed into an FTS5 query: all words must match, the last one as a prefix
+def build_match_query(query):
+    terms = QUERY_TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+# Search one user's transcripts
+def search_transcripts(user, query, limit=SEARCH_RESULT_LIMIT):
+    """
+    Finds the user's transcripts that contain every word of the query, best matches first.
+
+    :param user: Owner of the files, as "{name}_{key}".
+    :param query: Words to search for; the last word also matches as a prefix.
+    :param limit: Maximum number of results.
+    :return: List of dictionaries with 'path', 'title', 'snippet' (HTML with <mark> around
+        matches, everything else escaped) and 'score' (lower is better).
+    """
+    match_query = build_match_query(query)
+    if match_query is None:
+        return []
+    connection = _get_search_connection()
+    rows = connection.execute(
+        """SELECT d.path, d.title,
+                  snippet(search_fts, 1, ?, ?, '…', ?) AS snippet,
+                  bm25(search_fts, 5.0, 1.0) AS score
+           FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid
+           WHERE search_fts MATCH ? AND d.user = ?
+           ORDER BY score LIMIT ?""",
+        (SNIPPET_START, SNIPPET_END, SEARCH_SNIPPET_TOKENS, match_query, user, limit),
+    ).fetchall()
+    return [{
+        'path': row['path'],
+        'title': row['title'],
+        'snippet': html.escape(row['snippet']).replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>"),
+        'score': row['score'],
+    } for row in rows]
@@ -0,0 +1,49 @@
+import sqlite3
+import threading
+
+# One connection per thread and database file; sqlite3 connections must not be shared across threads
+_local = threading.local()
+_schema_lock = threading.Lock()
+_initialized_schemas = set()
+
+def get_connection(db_path):
+    """
+    Returns this thread's connection to the given SQLite database, opening it in WAL mode on first use.
+
+    WAL lets readers run alongside a single writer, and the busy timeout makes
+    concurrent writers from other sessions or processes wait instead of failing.
+
+    :param db_path: Path to the SQLite database file.
+    :return: A sqlite3.Connection owned by the calling thread.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(db_path)
+    if connection is None:
+        connection = sqlite3.connect(db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=30000")
+        connections[db_path] = connection
+    return connection
+
+def ensure_schema(db_path, statements):
+    """
+    Runs the given schema statements once per process for a database file.
+
+    :param db_path: Path to the SQLite database file.
+    :param statements: Iterable of idempotent SQL statements (CREATE ... IF NOT EXISTS).
+    :return: This thread's connection to the database.
+    """
+    connection = get_connection(db_path)
+    if db_path in _initialized_schemas:
+        return connection
+    with _schema_lock:
+        if db_path not in _initialized_schemas:
+            with connection:
+                for statement in statements:
+                    connection.execute(statement)
+            _initialized_schemas.add(db_path)
+    return connection
@@ -0,0 +1,39 @@
+import io
+import shutil
+import subprocess
+import pytest
+from media_probe_helpers import probe_media
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None,
+                                reason="ffmpeg and ffprobe are required")
+
+def _encode_tone(tmp_path, filename, *codec_args):
+    output_path = tmp_path / filename
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=5", *codec_args, str(output_path)],
+        check=True,
+    )
+    return output_path.read_bytes()
+
+def test_probe_mp3_buffer(tmp_path):
+    data = _encode_tone(tmp_path, "tone.mp3", "-c:a", "libmp3lame", "-b:a", "64k")
+    upload = io.BytesIO(data)
+    upload.name = "tone.mp3"
+    metadata = probe_media(upload)
+    assert metadata['duration'] == pytest.approx(5, abs=0.2)
+    assert metadata['audio_codec'] == "mp3"
+    assert metadata['size'] == len(data)
+
+def test_probe_mp4_buffer_with_moov_at_end(tmp_path):
+    # Without +faststart the muxer writes the moov atom after the media data
+    data = _encode_tone(tmp_path, "tone.mp4", "-c:a", "aac", "-b:a", "64k")
+    assert data.find(b"moov") > data.find(b"mdat")
+    upload = io.BytesIO(data)
+    upload.name = "tone.mp4"
+    metadata = probe_media(upload)
+    assert metadata['duration'] == pytest.approx(5, abs=0.2)
+    assert metadata['audio_codec'] == "aac"
+
+def test_probe_buffer_matches_path(tmp_path):
+    data = _encode_tone(tmp_path, "path.mp3", "-c:a", "libmp3lame", "-b:a", "64k")
+    assert probe_media(io.BytesIO(data))['duration'] == pytest.approx(probe_media(str(tmp_path / "path.mp3"))['duration'])
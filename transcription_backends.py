@@ -0,0 +1,132 @@
+import importlib.util
+import logging
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from api_helpers import call_whisper_api
+from config_const import (
+    WHISPER_MODEL, WHISPER_MAX_CONCURRENCY, WHISPER_PART_RETRIES, LOCAL_WHISPER_MODEL, LOCAL_WHISPER_COMPUTE_TYPE,
+    LOCAL_WHISPER_WORKERS, LOCAL_WHISPER_CPU_THREADS, LOCAL_WHISPER_BATCH_SIZE,
+)
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class TranscriptionBackend(ABC):
+    """
+    Turns one audio part into text. transcribe_and_save dispatches through a backend,
+    so the same pipeline, cache and checkpoints work for every engine.
+
+    Subclasses set name (used to select the backend), model (part of Whisper cache keys
+    and checkpoints, so results of different engines never mix), max_concurrency
+    (parts transcribed at the same time) and part_retries (extra attempts for a part
+    whose transcription failed).
+    """
+    name = None
+    model = None
+    max_concurrency = 1
+    part_retries = WHISPER_PART_RETRIES
+
+    @abstractmethod
+    def transcribe(self, file_path):
+        """
+        :param file_path: Path to an audio part.
+        :return: The transcribed text, or None if the transcription failed.
+        """
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """Transcribes with the OpenAI Whisper API."""
+    name = "openai"
+    model = WHISPER_MODEL
+    max_concurrency = WHISPER_MAX_CONCURRENCY
+    # ApiClient already retries each request with backoff and Retry-After, so a failure
+    # that reaches the pipeline is final
+    part_retries = 0
+
+    def __init__(self, openai_api_key):
+        self.openai_api_key = openai_api_key
+
+    def transcribe(self, file_path):
+        return call_whisper_api(file_path, self.openai_api_key)
+
+# Load a local Whisper model once per process and share it between threads
+@lru_cache(maxsize=None)
+def load_local_whisper_model(model_size, compute_type, num_workers, cpu_threads):
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError as e:
+        raise ImportError("The local transcription backend needs faster-whisper: pip install faster-whisper") from e
+    logging.info(f"Loading local Whisper model {model_size} ({compute_type}, {num_workers} workers)")
+    return WhisperModel(model_size, device="cpu", compute_type=compute_type, num_workers=num_workers, cpu_threads=cpu_threads)
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Transcribes on this machine's CPU with CTranslate2-based Whisper (faster-whisper).
+
+    The model is loaded once per process. It runs num_workers transcriptions in parallel,
+    which is also how many parts the pipeline sends at once, and decodes each part in
+    batches when the installed faster-whisper provides BatchedInferencePipeline.
+    """
+    name = "local"
+    # A local failure is a decoding error, not a transient one, so it is not retried
+    part_retries = 0
+
+    def __init__(self, model_size=LOCAL_WHISPER_MODEL, compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                 num_workers=LOCAL_WHISPER_WORKERS, cpu_threads=LOCAL_WHISPER_CPU_THREADS,
+                 batch_size=LOCAL_WHISPER_BATCH_SIZE):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.num_workers = num_workers
+        self.cpu_threads = cpu_threads
+        self.batch_size = batch_size
+        self.model = f"faster-whisper-{model_size}-{compute_type}"
+        self.max_concurrency = num_workers
+        self._pipeline = None
+        self._pipeline_lock = threading.Lock()
+
+    def _get_pipeline(self):
+        with self._pipeline_lock:
+            if self._pipeline is None:
+                model = load_local_whisper_model(self.model_size, self.compute_type, self.num_workers, self.cpu_threads)
+                try:
+                    from faster_whisper import BatchedInferencePipeline
+                    self._pipeline = BatchedInferencePipeline(model=model)
+                except ImportError:
+                    self._pipeline = None
+                    return model, False
+            return self._pipeline, True
+
+    def transcribe(self, file_path):
+        try:
+            engine, batched = self._get_pipeline()
+            options = {'batch_size': self.batch_size} if batched else {'beam_size': 5}
+            segments, _ = engine.transcribe(file_path, vad_filter=True, **options)
+            return " ".join(segment.text.strip() for segment in segments)
+        except ImportError:
+            raise
+        except Exception as e:
+            logging.error(f"Error transcribing {file_path} locally: {e}")
+            return None
+
+TRANSCRIPTION_BACKENDS = ["openai", "local"]
+
+# Backends that can run in this environment, without importing their dependencies
+def available_transcription_backends():
+    """
+    :return: The names in TRANSCRIPTION_BACKENDS whose dependencies are installed.
+    """
+    return [name for name in TRANSCRIPTION_BACKENDS
+            if name != "local" or importlib.util.find_spec("faster_whisper") is not None]
+
+# Create the backend selected for a job
+def get_transcription_backend(name, openai_api_key=None):
+    """
+    :param name: "openai" or "local".
+    :param openai_api_key: Your OpenAI API key; required for the OpenAI backend.
+    :return: A TranscriptionBackend instance.
+    """
+    if name == "openai":
+        return OpenAIWhisperBackend(openai_api_key)
+    if name == "local":
+        return LocalWhisperBackend()
+    raise ValueError(f"Unknown transcription backend: {name}")
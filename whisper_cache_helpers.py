@@ -0,0 +1,82 @@
+import logging
+import time
+from config_const import WHISPER_CACHE_DB_PATH, WHISPER_CACHE_MAX_BYTES
+from file_hash_helpers import calculate_file_hash_from_path
+from sqlite_helpers import ensure_schema
+
+# Set up basic configuration for logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CACHE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS whisper_cache (
+        cache_key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        text TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS whisper_cache_last_access ON whisper_cache (last_access)",
+    "CREATE TABLE IF NOT EXISTS whisper_cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO whisper_cache_stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0)",
+]
+
+def _get_cache_connection():
+    return ensure_schema(WHISPER_CACHE_DB_PATH, CACHE_SCHEMA)
+
+# Build the cache key from the part's audio bytes and the model that transcribed it
+def whisper_cache_key(file_path, model):
+    return f"{model}:{calculate_file_hash_from_path(file_path)}"
+
+# Look up a cached transcription for an audio part
+def get_cached_transcription(cache_key):
+    """
+    Returns the cached transcription for a key and marks it as recently used.
+
+    :param cache_key: Key returned by whisper_cache_key.
+    :return: The cached text or None on a miss.
+    """
+    connection = _get_cache_connection()
+    with connection:
+        row = connection.execute("SELECT text FROM whisper_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        if row is None:
+            connection.execute("UPDATE whisper_cache_stats SET value = value + 1 WHERE name = 'misses'")
+            return None
+        connection.execute("UPDATE whisper_cache SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+        connection.execute("UPDATE whisper_cache_stats SET value = value + 1 WHERE name = 'hits'")
+    logging.info(f"Whisper cache hit: {cache_key}")
+    return row['text']
+
+# Store a transcription and evict least recently used entries over the size budget
+def store_transcription(cache_key, model, text, max_bytes=WHISPER_CACHE_MAX_BYTES):
+    """
+    Stores a transcription in the cache, evicting the least recently used entries
+    until the total cached text fits in max_bytes.
+
+    :param cache_key: Key returned by whisper_cache_key.
+    :param model: Name of the model that produced the text.
+    :param text: The transcription.
+    :param max_bytes: Size budget for all cached text.
+    """
+    size = len(text.encode('utf-8'))
+    now = time.time()
+    connection = _get_cache_connection()
+    with connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO whisper_cache (cache_key, model, text, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+            (cache_key, model, text, size, now, now),
+        )
+        total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM whisper_cache").fetchone()[0]
+        evicted = 0
+        while total_size > max_bytes:
+            oldest = connection.execute(
+                "SELECT cache_key, size FROM whisper_cache WHERE cache_key != ? ORDER BY last_access LIMIT 1", (cache_key,)
+            ).fetchone()
+            if oldest is None:
+                break
+            connection.execute("DELETE FROM whisper_cache WHERE cache_key = ?", (oldest['cache_key'],))
+            total_size -= oldest['size']
+            evicted += 1
+        if evicted:
+            connection.execute("UPDATE whisper_cache_stats SET value = value + ? WHERE name = 'evictions'", (evicted,))
+            logging.info(f"Evicted {evicted} entries from the Whisper cache")